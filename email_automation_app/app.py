@@ -1,17 +1,33 @@
-import uvicorn, os
-from fastapi import FastAPI, Header, HTTPException, Depends
-from fastapi.responses import RedirectResponse
+import uvicorn, os, json
+from contextlib import asynccontextmanager
+from fastapi import FastAPI, Header, HTTPException, Depends, Request
+from fastapi.responses import RedirectResponse, Response
 from fastapi.middleware.cors import CORSMiddleware
+from sse_starlette.sse import EventSourceResponse
 from src.graph import Workflow
+from src.scheduler import InboxScheduler
+from src.jobs import JobManager
+from src.metrics import export_metrics
 from dotenv import load_dotenv
 
 # Load .env file
 load_dotenv()
 
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    # Build the workflow (LLM clients, vector DB, Google services, compiled graph) 
+    # once at startup, it is reused by every request
+    app.state.workflow = Workflow()
+    # Workflow runs are executed as background jobs, off the event loop
+    app.state.jobs = JobManager()
+    yield
+    app.state.jobs.shutdown()
+
 app = FastAPI(
     title="Gmail Automation",
     version="1.0",
     description="LangGraph backend for the AI Gmail automation workflow",
+    lifespan=lifespan,
 )
 
 # Set all CORS enabled origins
@@ -32,38 +48,51 @@ def verify_api_key(x_api_key: str = Header(...)):
 async def redirect_root_to_docs():
     return RedirectResponse("/docs")
 
-@app.post("/execute", dependencies=[Depends(verify_api_key)])
-async def generate_route():
-    workflow = Workflow()
-    automation = workflow.app
+@app.get("/metrics")
+async def metrics_route():
+    # Prometheus scrape endpoint
+    content, content_type = export_metrics()
+    return Response(content=content, media_type=content_type)
+
+@app.post("/execute", status_code=202, dependencies=[Depends(verify_api_key)])
+async def generate_route(request: Request):
+    scheduler = InboxScheduler(request.app.state.workflow)
+    return request.app.state.jobs.submit(scheduler.run)
 
-    # config 
-    config = {'recursion_limit': 1000}
+@app.post("/execute/stream", dependencies=[Depends(verify_api_key)])
+async def stream_route(request: Request):
+    # Stream the run progress as server-sent events instead of running it as a background job,
+    # the run still takes one of the MAX_CONCURRENT_JOBS slots
+    if not request.app.state.jobs.has_free_slot():
+        raise HTTPException(status_code=429, detail="Too many workflow runs in progress, retry later")
+    scheduler = InboxScheduler(request.app.state.workflow)
+    events = request.app.state.jobs.stream(
+        (
+            {"event": event.pop("event"), "data": json.dumps(event)}
+            for event in scheduler.stream()
+        ),
+        # Another run took the last slot after the check above
+        busy_event={"event": "error", "data": json.dumps({"error": "Too many workflow runs in progress, retry later"})}
+    )
+    return EventSourceResponse(events)
 
-    # state
-    initial_state = {
-        "emails": [],
-        "current_email": {
-            "id": "",
-            "threadId": "",
-            "sender": "",
-            "sender_email": "",
-            "subject": "",
-            "body": ""
-        },
-        "email_category": "",
-        "email_inquiries": [],
-        "retrieved_context": "",
-        "generated_email": "",
-        "editor_feedback": "",
-        "trials": 0
-    }
+@app.get("/jobs/{job_id}", dependencies=[Depends(verify_api_key)])
+async def job_status_route(job_id: str, request: Request):
+    job = request.app.state.jobs.get_status(job_id)
+    if job is None:
+        raise HTTPException(status_code=404, detail="Job not found")
+    return job
 
-    try:
-        outputs = automation.invoke(initial_state, config)
-        return {"result": outputs}
-    except Exception as e:
-        raise HTTPException(status_code=500, detail=str(e))
+@app.get("/jobs/{job_id}/result", dependencies=[Depends(verify_api_key)])
+async def job_result_route(job_id: str, request: Request):
+    job = request.app.state.jobs.get(job_id)
+    if job is None:
+        raise HTTPException(status_code=404, detail="Job not found")
+    if job["status"] == "failed":
+        raise HTTPException(status_code=500, detail=job["error"])
+    if job["status"] != "completed":
+        raise HTTPException(status_code=409, detail=f"Job is {job['status']}")
+    return {"result": job["result"]}
 
 
 def main():
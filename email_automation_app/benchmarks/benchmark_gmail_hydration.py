@@ -0,0 +1,59 @@
+"""
+Compare sequential `messages.get` hydration with the batched hydration path
+of GmailToolsClass against a local fake Gmail server.
+
+Usage: python benchmarks/benchmark_gmail_hydration.py --emails 200 --latency 0.05
+"""
+import os, sys, time, argparse
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from src.tools.GoogleAPITools import GmailToolsClass
+from benchmarks.fake_gmail import FakeGmailServer, make_message
+
+INBOX = "editorials@nabpress.com"
+
+def build_messages(count):
+    messages = []
+    for i in range(count):
+        sender = "Mail Delivery Subsystem <mailer-daemon@googlemail.com>" if i % 20 == 0 else f"Researcher {i} <researcher{i}@university.edu>"
+        body = f"Dear Editor,\n\nThank you for your invitation, I would like to publish my paper #{i}.\n\nRegards\n" * 5
+        messages.append(make_message(f"msg{i}", f"thread{i}", sender, f"Paper invitation {i} - Journal of Science", body))
+    return messages
+
+def hydrate_sequentially(gmail_tools, emails):
+    hydrated = []
+    for email in emails:
+        email_info = gmail_tools._get_email_info(email['id'])
+        if gmail_tools.skip_returned_emails(email_info['sender']):
+            continue
+        hydrated.append(email_info)
+    return hydrated
+
+def run(name, server, hydrate, emails):
+    server.calls.clear()
+    gmail_tools = GmailToolsClass(INBOX, service=server.build_service(), batch_uri=server.batch_uri)
+    start = time.perf_counter()
+    hydrated = hydrate(gmail_tools, emails)
+    duration = time.perf_counter() - start
+    http_requests = sum(count for call, count in server.calls.items() if "(batched)" not in call)
+    print(f"{name:<12} {len(hydrated):>6} emails {duration:>8.3f}s {http_requests:>6} HTTP requests")
+    return hydrated
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--emails", type=int, default=200, help="Number of unreplied emails to hydrate")
+    parser.add_argument("--latency", type=float, default=0.05, help="Simulated latency per HTTP round trip (seconds)")
+    args = parser.parse_args()
+
+    server = FakeGmailServer(build_messages(args.emails), latency=args.latency).start()
+    try:
+        emails = [{'id': f"msg{i}", 'threadId': f"thread{i}"} for i in range(args.emails)]
+        sequential = run("sequential", server, hydrate_sequentially, emails)
+        batched = run("batched", server, lambda tools, emails: tools._hydrate_emails(emails)[0], emails)
+        assert sequential == batched, "Batched hydration returned different emails"
+    finally:
+        server.stop()
+
+if __name__ == "__main__":
+    main()
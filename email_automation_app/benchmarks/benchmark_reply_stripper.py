@@ -0,0 +1,111 @@
+"""
+Compare the precompiled reply stripper of `src.utils` with the previous two-pass
+stripper (mail-parser-reply followed by a per-call compiled DOTALL regex) over a
+generated corpus of large emails: long quoted threads, Outlook headers, multilingual
+attributions and bodies without any separator. Long single-line bodies are only run
+through the current stripper.
+
+The previous stripper is only measured when mail-parser-reply is installed.
+
+Usage: python benchmarks/benchmark_reply_stripper.py --emails 200 --depth 20
+"""
+import os, re, sys, time, random, argparse
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from src.utils import strip_old_replies
+
+def legacy_strip_old_replies(body):
+    from mailparser_reply import EmailReplyParser
+    body = EmailReplyParser(languages=['en', 'de', 'fr', 'it']).parse_reply(text=body)
+    reply_pattern = re.compile(
+        r"(On\s.*?wrote:|Le\s.*?écrit :|From:\s.*?$|Sent:\s.*?$|Envoyé:\s.*?$|" +
+        r"Am\s.*?schrieb:|El\s.*?escribió:|Il\s.*?ha scritto:|在\s.*?写道:|" +
+        r"Em\s.*?escreveu:|Op\s.*?schreef:|日時：.*?差出人：|Pada\s.*?menulis:|" +
+        r"Dne\s.*?napsal:|W dniu\s.*?napisał:|Написано\s.*?:|Na\s.*?napisal:|" +
+        r"Tarihinde\s.*?yazdı:|Enviado\s.*?:|Op\s.*?skrev:|" +
+        r"På\s.*?skrev:|Den\s.*?skrev:|Enviado\s.*?por:|على\s.*?كتب:|" +
+        r"من\s.*?كتب:|Pošiljatelj\s.*?napisal:|.*?@\S+\s*wrote:|" +
+        r"Gönderildi:\s.*?$|Kime:\s.*?$)",
+        re.MULTILINE | re.DOTALL
+    )
+    match = reply_pattern.search(body)
+    body = body[:match.start()] if match else body
+    return re.sub(r'^>.*?$\n*', '', body, flags=re.MULTILINE).strip()
+
+PARAGRAPHS = [
+    "Thank you for your invitation to submit to the journal. I would like to publish my recent paper on renewable energy markets.",
+    "Could you please let me know the publication fees and the deadline for the next issue? Is the journal indexed in Scopus?",
+    "Our research group has been working on this topic for several years and we believe the results are relevant for your readers.",
+    "Please find attached the abstract. The manuscript is about 8000 words and follows the APA guidelines.",
+]
+ATTRIBUTIONS = [
+    "On Mon, 3 Jun 2024 at 10:15, Elena <editorials@nabpress.com> wrote:",
+    "On Tue, Jun 4, 2024 at 9:02 AM Journal Editorial Office\n<journals@nabpress.com> wrote:",
+    "Le mar. 4 juin 2024 à 09:02, Elena <editorials@nabpress.com> a écrit :",
+    "Am Di., 4. Juni 2024 um 09:02 Uhr schrieb Elena <editorials@nabpress.com>:",
+    "Il giorno mar 4 giu 2024 alle ore 09:02 Elena <editorials@nabpress.com> ha scritto:",
+    "From: Elena <editorials@nabpress.com>\nSent: Tuesday, June 4, 2024 9:02 AM\nTo: Researcher <r@uni.edu>\nSubject: RE: Invitation",
+]
+
+def build_email(rng, depth, paragraphs):
+    """
+    Latest reply on top of `depth` quoted replies, each quote level adds a ">" prefix.
+    """
+    parts = ["\n\n".join(rng.choice(PARAGRAPHS) for _ in range(paragraphs)), "Best regards,\nDr. Researcher"]
+    for level in range(1, depth + 1):
+        prefix = "> " * level
+        parts.append(rng.choice(ATTRIBUTIONS))
+        parts.extend(prefix + line for paragraph in rng.sample(PARAGRAPHS, 3) for line in paragraph.split("\n"))
+    return "\n\n".join(parts)
+
+def build_corpus(count, depth, seed=0):
+    rng = random.Random(seed)
+    corpus = [build_email(rng, rng.randint(1, depth), rng.randint(2, 6)) for _ in range(count)]
+    # Adversarial bodies: many lines starting like an attribution but never closing it
+    corpus += ["On the other hand the results of the survey are " + "very " * 200 + "\n" for _ in range(count // 10)] * 1
+    corpus += ["\n".join("On day %d we ran the experiment again and collected more data" % i for i in range(400))]
+    return corpus
+
+def build_long_lines(chars):
+    """
+    Long single-line bodies, attribution words and addresses all over the same line.
+    """
+    sentences = [
+        "Dear Elena, tarihinde our colleague wrote to a@b.c about the results. ",
+        "On the first day Am Montag the team schrieb Enviado the survey to x@y.org and z@w.net. "
+    ]
+    return [sentence * (chars // len(sentence)) for sentence in sentences]
+
+def run(name, strip, corpus):
+    start = time.perf_counter()
+    outputs = [strip(body) for body in corpus]
+    duration = time.perf_counter() - start
+    size = sum(len(body) for body in corpus) / 1e6
+    print(f"{name:<10} {duration:>8.3f}s {len(corpus) / duration:>10.1f} emails/s {size / duration:>8.2f} MB/s")
+    return outputs
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--emails", type=int, default=200, help="Emails in the generated corpus")
+    parser.add_argument("--depth", type=int, default=20, help="Maximum number of quoted replies per email")
+    parser.add_argument("--line-chars", type=int, default=288000, help="Size of the long single-line bodies")
+    args = parser.parse_args()
+
+    corpus = build_corpus(args.emails, args.depth)
+    print(f"{len(corpus)} emails, {sum(len(body) for body in corpus) / 1e6:.2f} MB\n")
+    outputs = run("current", strip_old_replies, corpus)
+    # Not run with the previous stripper, it is quadratic on long lines
+    run("long line", strip_old_replies, build_long_lines(args.line_chars))
+
+    try:
+        import mailparser_reply
+    except ImportError:
+        print("mail-parser-reply is not installed, skipping the previous stripper")
+        return
+    legacy_outputs = run("previous", legacy_strip_old_replies, corpus)
+    same = sum(a == b for a, b in zip(outputs, legacy_outputs))
+    print(f"\nSame output for {same}/{len(corpus)} emails")
+
+if __name__ == "__main__":
+    main()
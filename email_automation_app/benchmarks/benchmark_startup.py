@@ -0,0 +1,48 @@
+"""
+Measure the startup time of the FastAPI app (building the shared Workflow) and the 
+latency of successive `/execute` jobs reusing it, from submission to completion. Requires the same environment 
+as the app itself (.env with Google credentials and INTERNAL_API_KEY).
+
+Usage: python benchmarks/benchmark_startup.py --requests 5
+"""
+import os, sys, time, argparse, statistics
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from fastapi.testclient import TestClient
+from src.graph import Workflow
+from app import app
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--requests", type=int, default=5, help="Number of /execute requests to send")
+    args = parser.parse_args()
+
+    # Cost previously paid by every request
+    start = time.perf_counter()
+    Workflow()
+    print(f"Workflow construction: {time.perf_counter() - start:.3f}s")
+
+    start = time.perf_counter()
+    with TestClient(app) as client:
+        print(f"App startup (lifespan): {time.perf_counter() - start:.3f}s")
+        
+        headers = {"x-api-key": os.getenv("INTERNAL_API_KEY", "")}
+        latencies = []
+        for i in range(args.requests):
+            start = time.perf_counter()
+            job = client.post("/execute", headers=headers).json()
+            while job["status"] in ("queued", "running"):
+                time.sleep(0.05)
+                job = client.get(f"/jobs/{job['job_id']}", headers=headers).json()
+            latencies.append(time.perf_counter() - start)
+            print(f"Request {i + 1}: {job['status']} in {latencies[-1]:.3f}s")
+    
+    print(
+        f"Latency over {len(latencies)} requests: "
+        f"mean {statistics.mean(latencies):.3f}s, "
+        f"median {statistics.median(latencies):.3f}s, max {max(latencies):.3f}s"
+    )
+
+if __name__ == "__main__":
+    main()
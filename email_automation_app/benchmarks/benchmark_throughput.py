@@ -0,0 +1,202 @@
+"""
+Offline throughput benchmark of the whole workflow: inbox fixtures are replayed through
+the real graph against a local fake Gmail server, a fake Sheets service and deterministic
+fake chat & embedding models with configurable latencies.
+
+Reports emails per second, time per graph node and Gmail / LLM call counts per fixture.
+Fixtures are JSON files ({"inbox": ..., "messages": [Gmail messages in the full format]}),
+recorded from a live inbox with --record, or generated inboxes of the given --sizes.
+
+Usage:
+    python benchmarks/benchmark_throughput.py --sizes 10 100 500 --llm-latency 0.5 --gmail-latency 0.05
+    python benchmarks/benchmark_throughput.py --fixtures fixtures/editorials.json --output report.json
+    python benchmarks/benchmark_throughput.py --record editorials@nabpress.com --max-results 200 --output fixtures/editorials.json
+"""
+import os, sys, json, random, shutil, argparse, tempfile
+from collections import defaultdict
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+# Isolated state database & no cached LLM outputs between fixtures
+BENCHMARK_DIR = tempfile.mkdtemp()
+os.environ.setdefault("STATE_DATABASE_PATH", os.path.join(BENCHMARK_DIR, "benchmark_state.sqlite3"))
+# Local intent classifier trained on held-out replies, unless a model is given
+TRAIN_INTENT_CLASSIFIER = "INTENT_CLASSIFIER_PATH" not in os.environ
+os.environ.setdefault("INTENT_CLASSIFIER_PATH", os.path.join(BENCHMARK_DIR, "intent_classifier.json"))
+os.environ.setdefault("LLM_CACHE_ENABLED", "false")
+os.environ.setdefault("GMAIL_SYNC_MODE", "window")
+
+from src.agents import Agents
+from src.nodes import Nodes
+from src.graph import Workflow
+from src.scheduler import InboxScheduler
+from src.tools.GoogleAPITools import GmailToolsClass
+from src.utils import RAG_DATABASE_DIR, INTENT_CLASSIFIER_PATH
+from src.classifier import NaiveBayesIntentClassifier
+from scripts.train_intent_classifier import evaluate
+from benchmarks.fake_gmail import FakeGmailServer, make_message
+from benchmarks.fake_models import FakeChatModel, FakeEmbeddings
+
+# (body, intent) pairs
+BODIES = [
+    ("Dear Elena,\n\nThank you for the invitation. I would like to publish my paper, what are the fees and the deadline?\n\nBest regards,\nJohn", "Want to Publish"),
+    ("Hello,\n\nThe paper has already been published in another journal, sorry.\n\nRegards,\nMaria", "Paper Already Published"),
+    ("Dear Editor,\n\nI am not interested at the moment, thank you.\n\nPeter", "Not Interested"),
+    ("Hi Elena,\n\nI have another paper on energy markets that could fit the journal, is the journal indexed in Scopus?\n\nThanks,\nAnna", "Share Another Paper"),
+    ("Limited offer: buy cheap watches today!", "Unrelated"),
+    ("Dear Elena,\n\nI would like to submit my manuscript. What are the formatting guidelines and word count?\n\n" + "Kind regards,\nProf. Lee\nUniversity of Science\n" * 20, "Want to Publish"),
+]
+
+# Held-out training replies of the local intent classifier, other wordings than BODIES
+TRAINING_BODIES = [
+    ("Hello Elena,\n\nThanks for reaching out. We are interested in submitting our manuscript, could you send the submission fee?\n\nRegards,\nKim", "Want to Publish"),
+    ("Dear Editor,\n\nI am glad to submit my article to your journal. When is the submission deadline?\n\nBest,\nLuis", "Want to Publish"),
+    ("Dear Elena,\n\nUnfortunately this article was already published last year in a conference proceedings.\n\nBest,\nSara", "Paper Already Published"),
+    ("Hi,\n\nThe study you mention is already published elsewhere, thanks anyway.\n\nTom", "Paper Already Published"),
+    ("Hello,\n\nThank you but I am not interested in publishing with you.\n\nRegards,\nIvan", "Not Interested"),
+    ("Dear Elena,\n\nPlease remove me from your list, I am not interested.\n\nMark", "Not Interested"),
+    ("Dear Elena,\n\nI could instead share a different paper on climate finance with you, does the journal have an impact factor?\n\nBest,\nNina", "Share Another Paper"),
+    ("Hello,\n\nI have another paper that could fit better, is the journal indexed?\n\nThanks,\nOmar", "Share Another Paper"),
+    ("Win a free cruise, click here now!", "Unrelated"),
+    ("Your invoice for cloud hosting is attached.", "Unrelated"),
+]
+
+JOURNAL_PRICES = {"Journal of Science": 500, "Energy Markets Review": 650}
+
+class FakeSheetsTools:
+    def __init__(self, prices=None):
+        self.prices = prices or JOURNAL_PRICES
+
+    def fetch_sheet_data(self):
+        return dict(self.prices)
+
+def generate_fixture(size, inbox="editorials@nabpress.com", seed=0):
+    rng = random.Random(seed)
+    messages = []
+    for i in range(size):
+        if i % 25 == 0:
+            sender = "Mail Delivery Subsystem <mailer-daemon@googlemail.com>"
+        elif i % 10 == 0:
+            sender = f"Elena <{inbox}>"
+        else:
+            sender = f"Researcher {i} <researcher{i}@university.edu>"
+        body = rng.choice(BODIES)[0] + f"\n\nOn Mon, 1 Jan 2024 at 10:00, Elena <{inbox}> wrote:\n> Invitation to publish #{i}"
+        # Journal prices are looked up from the name at the end of the subject
+        subject = f"Invitation #{i} - {rng.choice(list(JOURNAL_PRICES))}"
+        messages.append(make_message(f"msg{i}", f"thread{i}", sender, subject, body))
+    return {"name": f"generated-{size}", "inbox": inbox, "messages": messages}
+
+def load_fixture(path):
+    with open(path) as f:
+        fixture = json.load(f)
+    fixture.setdefault("name", os.path.splitext(os.path.basename(path))[0])
+    return fixture
+
+def record_fixture(inbox, max_results, path):
+    """
+    Save recent messages of a live inbox as a fixture (requires the app Google credentials).
+    """
+    gmail_tools = GmailToolsClass(inbox)
+    msg_ids = [email["id"] for email in gmail_tools.fetch_recent_emails(max_results)]
+    messages, _ = gmail_tools._batch_get_messages(msg_ids, format="full")
+    with open(path, "w") as f:
+        json.dump({"inbox": inbox, "messages": [messages[msg_id] for msg_id in msg_ids if msg_id in messages]}, f)
+    print(f"Recorded {len(messages)} messages of {inbox} to {path}")
+
+def run_fixture(fixture, index, agents, args):
+    # Each fixture is replayed on its own inbox, own emails are rewritten to it
+    inbox = f"benchmark{index}@nabpress.com"
+    messages = json.loads(json.dumps(fixture["messages"]).replace(fixture["inbox"], inbox))
+    server = FakeGmailServer(messages, latency=args.gmail_latency).start()
+    nodes = Nodes(
+        agents=agents,
+        sheet_tools=FakeSheetsTools(),
+        gmail_tools_factory=lambda inbox, **kwargs: GmailToolsClass(
+            inbox, service=server.build_service(), batch_uri=server.batch_uri, **kwargs
+        )
+    )
+    scheduler = InboxScheduler(Workflow(nodes), inboxes=[inbox], batch_size=args.batch_size)
+    llm_calls_before = sum(agents_llm_calls(agents).values())
+
+    node_times = defaultdict(lambda: {"calls": 0, "total_s": 0.0})
+    for event in scheduler.stream():
+        if event["event"] == "node":
+            node_times[event["node"]]["calls"] += 1
+            node_times[event["node"]]["total_s"] += event["duration_ms"] / 1000
+        elif event["event"] == "done":
+            report = event
+    server.stop()
+
+    return {
+        "fixture": fixture["name"],
+        "messages": len(messages),
+        "emails_processed": report["emails_processed"],
+        "duration": report["duration"],
+        "emails_per_second": report["emails_per_second"],
+        "gmail_calls": dict(server.calls),
+        "llm_calls": sum(agents_llm_calls(agents).values()) - llm_calls_before,
+        # Cumulated over the fixtures, the agents are shared
+        "model_tiers": report["model_tiers"],
+        "local_classifier": report["local_classifier"],
+        "nodes": {node: {**times, "total_s": round(times["total_s"], 3)} for node, times in node_times.items()}
+    }
+
+def agents_llm_calls(agents):
+    return agents.fake_flash.calls + agents.fake_pro.calls
+
+def print_report(result):
+    gmail_http = sum(count for call, count in result["gmail_calls"].items() if "(batched)" not in call)
+    print(f"\n{result['fixture']}: {result['emails_processed']}/{result['messages']} emails in {result['duration']:.2f}s "
+          f"({result['emails_per_second']:.2f} emails/s), {gmail_http} Gmail HTTP calls, {result['llm_calls']} LLM calls")
+    for chain, tiers in result["model_tiers"].items():
+        print(f"  {chain} tiers: {tiers}")
+    print(f"  local classifier: {result['local_classifier']}")
+    for node, times in sorted(result["nodes"].items(), key=lambda item: -item[1]["total_s"]):
+        print(f"  {node:<32} {times['calls']:>6} runs {times['total_s']:>9.3f}s {times['total_s'] / times['calls'] * 1000:>9.1f}ms/run")
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--fixtures", nargs="*", default=[], help="Recorded inbox fixtures (JSON)")
+    parser.add_argument("--sizes", nargs="*", type=int, default=[10, 100], help="Sizes of generated inboxes")
+    parser.add_argument("--llm-latency", type=float, default=0.2, help="Fake flash model latency (s)")
+    parser.add_argument("--pro-latency", type=float, default=None, help="Fake pro model latency (s), defaults to 2x flash")
+    parser.add_argument("--invalid-draft-rate", type=float, default=0.1, help="Share of invalid flash drafts, escalated to pro")
+    parser.add_argument("--embedding-latency", type=float, default=0.05, help="Fake embedding request latency (s)")
+    parser.add_argument("--gmail-latency", type=float, default=0.02, help="Fake Gmail round trip latency (s)")
+    parser.add_argument("--batch-size", type=int, default=None, help="Emails per workflow batch")
+    parser.add_argument("--output", help="Write the JSON report (or the recorded fixture) to this file")
+    parser.add_argument("--record", metavar="INBOX", help="Record a fixture from a live inbox instead")
+    parser.add_argument("--max-results", type=int, default=100, help="Messages to record")
+    args = parser.parse_args()
+
+    if args.record:
+        return record_fixture(args.record, args.max_results, args.output or f"{args.record}.json")
+
+    if TRAIN_INTENT_CLASSIFIER:
+        # Evaluated on the bodies of the generated inboxes, never seen in training
+        classifier = NaiveBayesIntentClassifier.train(TRAINING_BODIES)
+        evaluate(classifier, BODIES, float(os.getenv("LOCAL_CLASSIFIER_THRESHOLD", 0.9)))
+        classifier.save(INTENT_CLASSIFIER_PATH)
+
+    # Work on a copy of the vector database, opening a Chroma client writes to its files
+    rag_database_dir = os.path.join(tempfile.mkdtemp(), "database")
+    shutil.copytree(RAG_DATABASE_DIR, rag_database_dir)
+    flash = FakeChatModel(model="fake-flash", latency=args.llm_latency, invalid_draft_rate=args.invalid_draft_rate)
+    pro = FakeChatModel(model="fake-pro", latency=args.pro_latency if args.pro_latency is not None else 2 * args.llm_latency)
+    agents = Agents(flash=flash, gemini=pro, embeddings=FakeEmbeddings(latency=args.embedding_latency), rag_database_dir=rag_database_dir)
+    agents.fake_flash, agents.fake_pro = flash, pro
+
+    fixtures = [load_fixture(path) for path in args.fixtures] + [generate_fixture(size) for size in args.sizes]
+    results = []
+    for index, fixture in enumerate(fixtures):
+        results.append(run_fixture(fixture, index, agents, args))
+        print_report(results[-1])
+    shutil.rmtree(os.path.dirname(rag_database_dir))
+
+    if args.output:
+        with open(args.output, "w") as f:
+            json.dump(results, f, indent=2)
+        print(f"\nReport saved to {args.output}")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,82 @@
+"""
+Compare the Chroma and the memory-mapped NumPy vector store backends on load time
+and query latency, using a copy of the RAG database.
+
+Each load is measured in a fresh process, queries are perturbed chunk embeddings 
+searched in batches of `--queries` vectors, as the retriever does for one email.
+
+Usage: python benchmarks/benchmark_vectorstores.py --iterations 200 --queries 3
+"""
+import os, sys, json, time, shutil, argparse, tempfile, subprocess
+import numpy as np
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from src.utils import RAG_DATABASE_DIR
+from src.vectorstores import load_vectorstore, NumpyVectorStore
+from src.retrieval import MultiQueryRetriever
+
+def measure_load(backend, persist_directory):
+    """
+    Child process: open the store and run a first query.
+    """
+    start = time.perf_counter()
+    vectorstore = load_vectorstore(None, persist_directory, backend)
+    retriever = MultiQueryRetriever(vectorstore, None, k=2)
+    retriever.search_by_vectors([np.ones(768).tolist()])
+    duration = time.perf_counter() - start
+    print(json.dumps({"load_ms": duration * 1000}))
+
+def run_load(backend, persist_directory):
+    output = subprocess.run(
+        [sys.executable, __file__, "--child", backend, "--persist-directory", persist_directory],
+        capture_output=True, text=True, check=True
+    ).stdout
+    return json.loads(output.strip().splitlines()[-1])
+
+def run_queries(retriever, queries, iterations, batch):
+    latencies, results = [], []
+    for i in range(iterations):
+        vectors = queries[(i * batch) % len(queries):][:batch]
+        start = time.perf_counter()
+        docs = retriever.search_by_vectors(vectors)
+        latencies.append((time.perf_counter() - start) * 1000)
+        results.append([[doc.page_content for doc in query_docs] for query_docs in docs])
+    return np.percentile(latencies, [50, 95]), results
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--persist-directory", default=RAG_DATABASE_DIR, help="Chroma database to copy")
+    parser.add_argument("--iterations", type=int, default=200)
+    parser.add_argument("--queries", type=int, default=3, help="Query vectors per search")
+    parser.add_argument("--child", help=argparse.SUPPRESS)
+    args = parser.parse_args()
+    if args.child:
+        return measure_load(args.child, args.persist_directory)
+
+    # Work on a copy, opening a Chroma client writes to its files
+    workdir = tempfile.mkdtemp()
+    persist_directory = os.path.join(workdir, "database")
+    shutil.copytree(args.persist_directory, persist_directory)
+    chroma = load_vectorstore(None, persist_directory, "chroma")
+    NumpyVectorStore.from_chroma(chroma, persist_directory)
+
+    embeddings = np.asarray(chroma.get(include=["embeddings"])["embeddings"])
+    rng = np.random.default_rng(0)
+    queries = (embeddings + rng.normal(0, 0.02, embeddings.shape)).tolist()
+    print(f"{len(embeddings)} chunks, {embeddings.shape[1]} dimensions\n")
+
+    results = {}
+    for backend in ["chroma", "numpy"]:
+        load = run_load(backend, persist_directory)
+        retriever = MultiQueryRetriever(load_vectorstore(None, persist_directory, backend), None, k=2)
+        (p50, p95), results[backend] = run_queries(retriever, queries, args.iterations, args.queries)
+        print(f"{backend:<8} load {load['load_ms']:>8.1f}ms  "
+              f"query p50 {p50:>6.3f}ms  p95 {p95:>6.3f}ms")
+
+    same = sum(a == b for a, b in zip(results["chroma"], results["numpy"]))
+    print(f"\nIdentical top-k for {same}/{args.iterations} searches (Chroma HNSW is approximate)")
+    shutil.rmtree(workdir)
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,230 @@
+import json, time, base64, threading
+from collections import Counter
+from email.parser import Parser
+from urllib.parse import urlparse, parse_qs, unquote
+from http.server import ThreadingHTTPServer, BaseHTTPRequestHandler
+
+def make_message(msg_id, thread_id, sender, subject, body):
+    """
+    Build a Gmail API message resource in the `full` format.
+    """
+    return {
+        'id': msg_id,
+        'threadId': thread_id,
+        'payload': {
+            'mimeType': 'text/plain',
+            'headers': [
+                {'name': 'From', 'value': sender},
+                {'name': 'Subject', 'value': subject},
+                {'name': 'Date', 'value': 'Mon, 1 Jan 2024 10:00:00 +0000'}
+            ],
+            'body': {'data': base64.urlsafe_b64encode(body.encode()).decode()}
+        }
+    }
+
+class FakeGmailServer:
+    def __init__(self, messages, latency=0.0, port=0):
+        """
+        Local HTTP server emulating the Gmail REST endpoints used by GmailToolsClass.
+        `latency` (seconds) is added to every HTTP round trip, batch or not.
+        """
+        self.messages = {msg['id']: msg for msg in messages}
+        self.message_order = [msg['id'] for msg in messages]
+        self.drafts = []
+        self.latency = latency
+        self.calls = Counter()
+        self.lock = threading.Lock()
+        # Remaining injected errors of message gets, by (message id, format)
+        self.get_errors = Counter()
+        # Each message was added to the inbox by its own history record, oldest last
+        self.history_id = 100
+        self.history = []
+        for msg in reversed(messages):
+            self.add_history(msg)
+        self.httpd = ThreadingHTTPServer(("127.0.0.1", port), self._make_handler())
+        self.thread = None
+
+    @property
+    def base_url(self):
+        return f"http://127.0.0.1:{self.httpd.server_address[1]}/"
+
+    @property
+    def batch_uri(self):
+        return f"{self.base_url}batch/gmail/v1"
+
+    def start(self):
+        self.thread = threading.Thread(target=self.httpd.serve_forever, daemon=True)
+        self.thread.start()
+        return self
+
+    def stop(self):
+        self.httpd.shutdown()
+        self.httpd.server_close()
+
+    def build_service(self):
+        """
+        Build a Gmail API client pointing at this server, without any credentials.
+        """
+        import httplib2
+        from googleapiclient.discovery import build
+        return build(
+            'gmail', 'v1', 
+            http=httplib2.Http(), 
+            client_options={'api_endpoint': self.base_url},
+            static_discovery=True
+        )
+
+    def add_history(self, msg):
+        with self.lock:
+            self.history_id += 1
+            self.history.append((self.history_id, msg['id']))
+
+    def add_message(self, msg):
+        """
+        Deliver a new message to the inbox, listed first and in the history.
+        """
+        self.messages[msg['id']] = msg
+        self.message_order.insert(0, msg['id'])
+        self.add_history(msg)
+
+    def fail_gets(self, msg_id, times=1, format='full'):
+        """
+        Answer the next `times` gets of a message in the given format with a 429 rate limit error.
+        """
+        with self.lock:
+            self.get_errors[(msg_id, format)] += times
+
+    def dispatch(self, method, path, query, body):
+        parts = [unquote(part) for part in path.strip("/").split("/")]
+        if parts[:2] != ["gmail", "v1"] or len(parts) < 5 or parts[2] != "users":
+            return 404, {"error": {"code": 404, "message": f"Unknown path {path}"}}
+        resource, rest = parts[4], parts[5:]
+        
+        if resource == "messages" and method == "GET" and not rest:
+            return 200, self._list_messages(query)
+        if resource == "messages" and method == "GET" and len(rest) == 1:
+            return self._get_message(rest[0], query.get('format', ['full'])[0], query.get('metadataHeaders', []))
+        if resource == "history" and method == "GET":
+            return 200, self._list_history(query)
+        if resource == "profile" and method == "GET":
+            return 200, {'emailAddress': parts[3], 'historyId': str(self.history_id)}
+        if resource == "drafts" and method == "GET":
+            return 200, self._list_drafts(query)
+        if resource == "drafts" and method == "POST":
+            return 200, self._create_draft(json.loads(body or "{}"))
+        return 404, {"error": {"code": 404, "message": f"Unknown path {path}"}}
+
+    def _list_messages(self, query):
+        max_results = int(query.get('maxResults', ['100'])[0])
+        start = int(query.get('pageToken', ['0'])[0])
+        ids = self.message_order[start:start + max_results]
+        response = {
+            'messages': [{'id': msg_id, 'threadId': self.messages[msg_id]['threadId']} for msg_id in ids],
+            'resultSizeEstimate': len(ids)
+        }
+        if start + max_results < len(self.message_order):
+            response['nextPageToken'] = str(start + max_results)
+        return response
+
+    def _list_history(self, query):
+        start_history_id = int(query['startHistoryId'][0])
+        records = [
+            {
+                'id': str(history_id),
+                'messagesAdded': [{'message': {'id': msg_id, 'threadId': self.messages[msg_id]['threadId']}}]
+            }
+            for history_id, msg_id in self.history if history_id > start_history_id
+        ]
+        return {'history': records, 'historyId': str(self.history_id)}
+
+    def _get_message(self, msg_id, format, metadata_headers):
+        with self.lock:
+            if self.get_errors[(msg_id, format)] > 0:
+                self.get_errors[(msg_id, format)] -= 1
+                return 429, {"error": {"code": 429, "message": "Too many concurrent requests for user.", "status": "RESOURCE_EXHAUSTED"}}
+        if msg_id not in self.messages:
+            return 404, {"error": {"code": 404, "message": "Requested entity was not found."}}
+        msg = self.messages[msg_id]
+        if format == 'metadata':
+            wanted = {name.lower() for name in metadata_headers}
+            headers = [h for h in msg['payload']['headers'] if not wanted or h['name'].lower() in wanted]
+            return 200, {'id': msg['id'], 'threadId': msg['threadId'], 'payload': {'headers': headers}}
+        return 200, msg
+
+    def _list_drafts(self, query):
+        max_results = int(query.get('maxResults', ['100'])[0])
+        start = int(query.get('pageToken', ['0'])[0])
+        response = {'drafts': self.drafts[start:start + max_results]}
+        if start + max_results < len(self.drafts):
+            response['nextPageToken'] = str(start + max_results)
+        return response
+
+    def _create_draft(self, body):
+        with self.lock:
+            draft_id = f"draft-{len(self.drafts) + 1}"
+            draft = {
+                'id': draft_id,
+                'message': {'id': f"{draft_id}-msg", 'threadId': body.get('message', {}).get('threadId', '')}
+            }
+            self.drafts.append(draft)
+        return draft
+
+    def dispatch_batch(self, content_type, body):
+        boundary = "batch_response_boundary"
+        message = Parser().parsestr(f"content-type: {content_type}\r\n\r\n{body}")
+        chunks = []
+        for part in message.get_payload():
+            request_line, _, rest = part.get_payload().partition("\r\n" if "\r\n" in part.get_payload() else "\n")
+            method, url, _ = request_line.split(" ", 2)
+            _, _, sub_body = rest.replace("\r\n", "\n").partition("\n\n")
+            parsed = urlparse(url)
+            self.calls[f"{method} {self._route_name(parsed.path)} (batched)"] += 1
+            status, payload = self.dispatch(method, parsed.path, parse_qs(parsed.query), sub_body)
+            content_id = part['Content-ID'].replace("<", "<response-", 1)
+            chunks.append(
+                f"--{boundary}\r\nContent-Type: application/http\r\nContent-ID: {content_id}\r\n\r\n"
+                f"HTTP/1.1 {status} {'OK' if status == 200 else 'Error'}\r\n"
+                f"Content-Type: application/json; charset=UTF-8\r\n\r\n{json.dumps(payload)}\r\n"
+            )
+        chunks.append(f"--{boundary}--\r\n")
+        return f"multipart/mixed; boundary={boundary}", "".join(chunks)
+
+    def _route_name(self, path):
+        parts = path.strip("/").split("/")
+        return "/".join(parts[4:5] + (["{id}"] if len(parts) > 5 else []))
+
+    def _make_handler(self):
+        server = self
+
+        class Handler(BaseHTTPRequestHandler):
+            def log_message(self, format, *args):
+                pass
+
+            def _reply(self, status, content_type, content):
+                data = content.encode()
+                self.send_response(status)
+                self.send_header("Content-Type", content_type)
+                self.send_header("Content-Length", str(len(data)))
+                self.end_headers()
+                self.wfile.write(data)
+
+            def _handle(self, method):
+                time.sleep(server.latency)
+                length = int(self.headers.get("Content-Length", 0))
+                body = self.rfile.read(length).decode() if length else ""
+                parsed = urlparse(self.path)
+                if parsed.path.startswith("/batch/"):
+                    server.calls["POST batch"] += 1
+                    content_type, content = server.dispatch_batch(self.headers["Content-Type"], body)
+                    return self._reply(200, content_type, content)
+                server.calls[f"{method} {server._route_name(parsed.path)}"] += 1
+                status, payload = server.dispatch(method, parsed.path, parse_qs(parsed.query), body)
+                self._reply(status, "application/json; charset=UTF-8", json.dumps(payload))
+
+            def do_GET(self):
+                self._handle("GET")
+
+            def do_POST(self):
+                self._handle("POST")
+
+        return Handler
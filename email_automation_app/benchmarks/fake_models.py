@@ -0,0 +1,142 @@
+import re, json, time, hashlib, threading
+from collections import Counter
+from typing import Any, List, Optional
+from langchain_core.embeddings import Embeddings
+from langchain_core.language_models.chat_models import BaseChatModel
+from langchain_core.messages import AIMessage
+from langchain_core.outputs import ChatGeneration, ChatResult
+from src.prompts import (
+    EMAIL_PARSER_PROMPT,
+    INTENT_DETECTION_PROMPT,
+    INQUIRY_EXTRACTION_PROMPT,
+    TRIAGE_PROMPT,
+    TRIAGE_CLEAN_BODY,
+    DOCS_WRITER_PROMPT,
+    STANDARD_EMAIL_RESPONSE_PROMPT,
+    RAG_EMAIL_RESPONSE_PROMPT_TEMPLATE,
+    INFORMATION_UPDATER_PROMPT,
+    EDITOR_EMAIL_ANALYSIS_PROMPT_TEMPLATE,
+    EMAIL_REWRITER_PROMPT_TEMPLATE
+)
+
+# Each chain is recognized by the first line of its prompt template
+PROMPT_CHAINS = {
+    EMAIL_PARSER_PROMPT: "email_parse",
+    INTENT_DETECTION_PROMPT: "intent_detection",
+    INQUIRY_EXTRACTION_PROMPT: "inquiry_extraction",
+    TRIAGE_PROMPT: "triage",
+    DOCS_WRITER_PROMPT: "docs_writer",
+    STANDARD_EMAIL_RESPONSE_PROMPT: "write_standard_email",
+    RAG_EMAIL_RESPONSE_PROMPT_TEMPLATE: "write_email",
+    INFORMATION_UPDATER_PROMPT: "update_email_info",
+    EDITOR_EMAIL_ANALYSIS_PROMPT_TEMPLATE: "email_editor",
+    EMAIL_REWRITER_PROMPT_TEMPLATE: "email_rewriter",
+}
+PROMPT_CHAINS = {prompt.strip().splitlines()[0]: chain for prompt, chain in PROMPT_CHAINS.items()}
+
+INTENT_KEYWORDS = [
+    (r"already (?:been )?published", "Paper Already Published"),
+    (r"another paper|different paper|other manuscript", "Share Another Paper"),
+    (r"not interested|no,? thank|decline", "Not Interested"),
+    (r"publish|submit|fees?\b", "Want to Publish"),
+]
+INQUIRY_KEYWORDS = [
+    (r"fee|charge|cost|price", "Fees or Charges"),
+    (r"deadline|when", "Submission Deadlines"),
+    (r"index|scopus", "Journal Indexing"),
+    (r"guideline|format|word count|pages", "Submission Guidelines (formatting, word count, or page count)"),
+]
+WRITER_SLOT_SENTENCES = [
+    (r"fee|charge|cost|price", "The annual publication cost is [JOURNAL_PRICE]."),
+    (r"deadline|when", "The next submission deadline is [SUBMISSION_DEADLINE]."),
+]
+DRAFT_REPLY = """Dear Researcher,
+
+Thank you for your reply. Please find below the details regarding the submission to our journal.
+
+Regards,
+Elena"""
+
+class FakeChatModel(BaseChatModel):
+    """
+    Deterministic chat model answering each chain of `Agents` with a valid output,
+    after `latency` seconds. Calls are counted per chain in `calls`. A share of the
+    drafts (`invalid_draft_rate`, picked from a hash of the prompt) are left with an
+    unfilled placeholder, to exercise the escalation of flash drafts.
+    """
+    model: str = "fake"
+    latency: float = 0.0
+    invalid_draft_rate: float = 0.0
+    calls: Any = None
+    lock: Any = None
+
+    def __init__(self, **kwargs):
+        super().__init__(**kwargs)
+        self.calls = Counter()
+        self.lock = threading.Lock()
+
+    @property
+    def _llm_type(self):
+        return "fake-chat"
+
+    def _generate(self, messages, stop: Optional[List[str]] = None, run_manager=None, **kwargs):
+        prompt = messages[-1].content
+        chain = PROMPT_CHAINS.get(prompt.strip().splitlines()[0], "unknown")
+        with self.lock:
+            self.calls[chain] += 1
+        time.sleep(self.latency)
+
+        content = self.respond(chain, prompt)
+        return ChatResult(generations=[ChatGeneration(message=AIMessage(content=content))])
+
+    def respond(self, chain, prompt):
+        match = re.search(r"<email>(.*?)</email>", prompt, re.DOTALL)
+        email = match.group(1).strip() if match else ""
+        if chain == "email_parse":
+            return email[:1000]
+        if chain == "intent_detection":
+            intent = next((intent for pattern, intent in INTENT_KEYWORDS if re.search(pattern, email, re.I)), "Unrelated")
+            return json.dumps({"intent": intent})
+        if chain in ("inquiry_extraction", "triage"):
+            inquiries = [inquiry for pattern, inquiry in INQUIRY_KEYWORDS if re.search(pattern, email, re.I)]
+            if chain == "inquiry_extraction":
+                return json.dumps({"inquiries": inquiries})
+            intent = next((intent for pattern, intent in INTENT_KEYWORDS if re.search(pattern, email, re.I)), "Unrelated")
+            body = email[:1000] if TRIAGE_CLEAN_BODY in prompt else ""
+            return json.dumps({"body": body, "intent": intent, "inquiries": inquiries})
+        if chain == "docs_writer":
+            return prompt.split("## Past Email Replies:")[-1][:800].strip()
+        if chain == "email_editor":
+            return json.dumps({"send": True, "feedback": ""})
+        draft = DRAFT_REPLY
+        if chain == "write_email":
+            # Cost & deadline are left in their slots, as asked by the writer prompt
+            sender_email = prompt.split("## Sender Email:")[-1].split("## Previous Emails Context:")[0]
+            details = [sentence for pattern, sentence in WRITER_SLOT_SENTENCES if re.search(pattern, sender_email, re.I)]
+            draft = draft.replace("our journal.", "our journal. " + " ".join(details))
+        if int(hashlib.sha256(prompt.encode()).hexdigest(), 16) % 1000 < self.invalid_draft_rate * 1000:
+            return draft.replace("Dear Researcher", "Dear [Recipient Name]")
+        return draft
+
+class FakeEmbeddings(Embeddings):
+    def __init__(self, dimension=768, latency=0.0):
+        """
+        Deterministic unit vectors derived from a hash of the text, `latency` seconds per request.
+        """
+        self.dimension = dimension
+        self.latency = latency
+        self.calls = 0
+
+    def embed_documents(self, texts, **kwargs):
+        self.calls += 1
+        time.sleep(self.latency)
+        return [self._embed(text) for text in texts]
+
+    def embed_query(self, text, **kwargs):
+        return self.embed_documents([text])[0]
+
+    def _embed(self, text):
+        digest = hashlib.sha256(text.encode()).digest()
+        values = [(digest[i % len(digest)] ^ (i * 31 % 256)) / 255 - 0.5 for i in range(self.dimension)]
+        norm = sum(value * value for value in values) ** 0.5
+        return [value / norm for value in values]
@@ -0,0 +1,65 @@
+"""
+Incrementally build the vector database used by the RAG agents.
+
+Chunks are identified by a hash of their source (relative to the repository root, 
+or INDEX_SOURCE_ROOT) and content: only new or changed chunks are embedded and 
+upserted, and chunks that disappeared from the sources are deleted. The inquiry 
+label index is rebuilt whenever the database content changes.
+
+The NumPy backend (VECTOR_STORE_BACKEND=numpy) is built with --backend numpy, 
+--from-chroma first copies the chunks & embeddings of the Chroma database into it.
+
+Usage: 
+    python scripts/build_index.py data/past_replies.txt data/faq/ --separator "\\n\\n###\\n\\n"
+    python scripts/build_index.py --backend numpy --from-chroma
+"""
+import os, sys, json, argparse
+from dotenv import load_dotenv
+from langchain_google_genai import GoogleGenerativeAIEmbeddings
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from src.indexing import build_index, EMBEDDING_BATCH_SIZE, EMBEDDING_WORKERS
+from src.utils import RAG_DATABASE_DIR
+from src.vectorstores import load_vectorstore, NumpyVectorStore
+
+# Load environment variables from a .env file
+load_dotenv()
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("sources", nargs="*", help="Source files or directories (.txt, .md) to index")
+    parser.add_argument("--persist-directory", default=RAG_DATABASE_DIR, help="Vector database directory")
+    parser.add_argument("--backend", default=os.getenv("VECTOR_STORE_BACKEND", "chroma"), choices=["chroma", "numpy"])
+    parser.add_argument("--from-chroma", action="store_true", help="Copy the Chroma database into the NumPy backend")
+    parser.add_argument("--separator", help="Split the sources into one chunk per record on this separator")
+    parser.add_argument("--chunk-size", type=int, default=200, help="Chunk size when no separator is given")
+    parser.add_argument("--chunk-overlap", type=int, default=50, help="Chunk overlap when no separator is given")
+    parser.add_argument("--batch-size", type=int, default=EMBEDDING_BATCH_SIZE, help="Chunks per embedding request")
+    parser.add_argument("--workers", type=int, default=EMBEDDING_WORKERS, help="Parallel embedding requests")
+    args = parser.parse_args()
+    if args.from_chroma and args.backend != "numpy":
+        parser.error("--from-chroma copies the Chroma database into the NumPy backend, use it with --backend numpy")
+    if not args.sources and not args.from_chroma:
+        parser.error("give the sources to index, or --from-chroma")
+    separator = args.separator.encode().decode("unicode_escape") if args.separator else None
+
+    embeddings = GoogleGenerativeAIEmbeddings(model="models/text-embedding-004")
+    if args.from_chroma:
+        # Embeddings are copied, not computed again, the label index stays valid for the same chunks
+        chroma = load_vectorstore(embeddings, args.persist_directory, "chroma")
+        vectorstore = NumpyVectorStore.from_chroma(chroma, args.persist_directory)
+        print(f"Copied {len(vectorstore.get_ids())} chunks from Chroma to the NumPy index")
+        if not args.sources:
+            return
+    else:
+        vectorstore = load_vectorstore(embeddings, args.persist_directory, args.backend, create=True)
+    report = build_index(
+        vectorstore, embeddings, args.sources, args.persist_directory, 
+        chunk_size=args.chunk_size, chunk_overlap=args.chunk_overlap, separator=separator,
+        batch_size=args.batch_size, workers=args.workers
+    )
+    print(json.dumps(report, indent=2))
+
+if __name__ == "__main__":
+    main()
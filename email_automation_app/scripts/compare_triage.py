@@ -0,0 +1,98 @@
+"""
+Compare the two triage paths of the workflow on labeled replies: the separate parse,
+intent & inquiry calls against the single combined triage call (TRIAGE_MODE).
+
+The data is a JSONL file of past labeled replies, one object per line with the email
+"body", its "intent" and optionally its "inquiries" (list of inquiry types).
+Reports per path the LLM latency per email, the intent accuracy, the inquiries
+precision & recall, and how often both paths agree.
+
+Usage: python scripts/compare_triage.py --data labeled_replies.jsonl --limit 200
+"""
+import os, sys, json, time, argparse
+from concurrent.futures import ThreadPoolExecutor
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+# Both paths must call the LLM for every email
+os.environ["LLM_CACHE_ENABLED"] = "false"
+
+from src.agents import Agents
+from src.nodes import RAG_CATEGORIES
+from src.prompts import TRIAGE_CLEAN_BODY, TRIAGE_KEEP_BODY
+
+def prepare_body(body):
+    # Same as `Nodes.parse_email_content` for short emails
+    if len(body) <= 30:
+        return f"Note this a response to our outreach email mentioning our interest in publishing a paper.\n\n{body}"
+    return body
+
+def triage_separate(agents, body):
+    body = prepare_body(body)
+    if len(body) > 1000:
+        body = agents.email_parse_chain.invoke({"email_content": body})
+    intent = agents.intent_detection_chain.invoke({"email_content": body})["intent"]
+    inquiries = []
+    if intent in RAG_CATEGORIES:
+        inquiries = agents.inquiry_extraction_chain.invoke({"email_content": body})["inquiries"]
+    return intent, inquiries
+
+def triage_combined(agents, body):
+    body = prepare_body(body)
+    result = agents.triage_chain.invoke({
+        "email_content": body,
+        "body_instruction": TRIAGE_CLEAN_BODY if len(body) > 1000 else TRIAGE_KEEP_BODY
+    })
+    return result["intent"], result["inquiries"] if result["intent"] in RAG_CATEGORIES else []
+
+def run_path(triage, agents, example):
+    start = time.perf_counter()
+    try:
+        intent, inquiries = triage(agents, example["body"])
+    except Exception as e:
+        print(f"An error occurred while triaging an email: {e}")
+        intent, inquiries = None, []
+    return intent, set(inquiries), time.perf_counter() - start
+
+def summarize(name, examples, outputs):
+    durations = sorted(duration for _, _, duration in outputs)
+    errors = sum(intent is None for intent, _, _ in outputs)
+    accuracy = sum(intent == example["intent"] for example, (intent, _, _) in zip(examples, outputs)) / len(examples)
+
+    labeled = [(set(example["inquiries"]), inquiries) for example, (_, inquiries, _) in zip(examples, outputs) if "inquiries" in example]
+    true_positives = sum(len(expected & predicted) for expected, predicted in labeled)
+    predicted_count = sum(len(predicted) for _, predicted in labeled)
+    expected_count = sum(len(expected) for expected, _ in labeled)
+    precision = true_positives / predicted_count if predicted_count else 0.0
+    recall = true_positives / expected_count if expected_count else 0.0
+
+    print(
+        f"{name:<9} latency mean {sum(durations) / len(durations):.2f}s p50 {durations[len(durations) // 2]:.2f}s "
+        f"p95 {durations[int(len(durations) * 0.95)]:.2f}s | intent accuracy {accuracy:.1%} | "
+        f"inquiries precision {precision:.1%} recall {recall:.1%} ({len(labeled)} labeled) | {errors} errors"
+    )
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--data", required=True, help="JSONL file of labeled replies")
+    parser.add_argument("--limit", type=int, default=None, help="Number of replies to compare")
+    parser.add_argument("--workers", type=int, default=4, help="Emails triaged in parallel")
+    args = parser.parse_args()
+
+    with open(args.data) as f:
+        examples = [row for row in map(json.loads, f) if row.get("body") and row.get("intent")][:args.limit]
+    print(f"Comparing triage paths on {len(examples)} labeled replies\n")
+
+    agents = Agents()
+    results = {}
+    for name, triage in [("separate", triage_separate), ("combined", triage_combined)]:
+        with ThreadPoolExecutor(max_workers=args.workers) as executor:
+            results[name] = list(executor.map(lambda example: run_path(triage, agents, example), examples))
+        summarize(name, examples, results[name])
+
+    same_intent = sum(a[0] == b[0] for a, b in zip(results["separate"], results["combined"]))
+    same_inquiries = sum(a[:2] == b[:2] for a, b in zip(results["separate"], results["combined"]))
+    print(f"\nSame intent for {same_intent}/{len(examples)} replies, same intent & inquiries for {same_inquiries}")
+
+if __name__ == "__main__":
+    main()
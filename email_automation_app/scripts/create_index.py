@@ -1,57 +0,0 @@
-import os
-from langchain_community.document_loaders import TextLoader
-from langchain_text_splitters import RecursiveCharacterTextSplitter
-from langchain_google_genai import ChatGoogleGenerativeAI, GoogleGenerativeAIEmbeddings
-from langchain_chroma import Chroma
-from langchain_core.prompts import ChatPromptTemplate
-from langchain_core.runnables import RunnablePassthrough
-from langchain_core.output_parsers import StrOutputParser
-from dotenv import load_dotenv
-
-# Load environment variables from a .env file
-load_dotenv()
-
-RAG_SEARCH_PROMPT_TEMPLATE = """
-Using the following pieces of retrieved context, answer the question comprehensively and concisely.
-Ensure your response fully addresses the question based on the given context.
-
-**IMPORTANT:**
-Just provide the answer and never mention or refer to having access to the external context or information in your answer.
-If you are unable to determine the answer from the provided context, state 'I don't know.'
-
-Question: {question}
-Context: {context}
-"""
-
-print("Loading Docs...")
-loader = TextLoader("./data/agency.txt")
-docs = loader.load()
-
-print("Splitting Docs...")
-doc_splitter = RecursiveCharacterTextSplitter(chunk_size=200, chunk_overlap=50)
-doc_chunks = doc_splitter.split_documents(docs)
-
-print("Loading embedding model...")
-embeddings = GoogleGenerativeAIEmbeddings(model="models/text-embedding-004")
-
-print("Creating vector store...")
-vectorstore = Chroma.from_documents(doc_chunks, embeddings, persist_directory="db")
-
-# Semantic vector search
-vectorstore_retriever = vectorstore.as_retriever(search_kwargs={"k": 3})
-
-# Test RAG chain
-prompt = ChatPromptTemplate.from_template(RAG_SEARCH_PROMPT_TEMPLATE)
-llm = ChatGoogleGenerativeAI(model="gemini-1.5-flash", temperature=0.1)
-
-rag_chain = (
-    {"context": vectorstore_retriever, "question": RunnablePassthrough()}
-    | prompt
-    | llm
-    | StrOutputParser()
-)
-
-query = "How does the coffe machine work?"
-result = rag_chain.invoke(query)
-print(result)
-
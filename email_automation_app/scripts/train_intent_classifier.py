@@ -0,0 +1,49 @@
+"""
+Train the local intent classifier used ahead of the intent detection LLM.
+
+The training data is a JSONL file of past labeled replies, one object per line 
+with the email "body" and its "intent" (one of the intents of INTENT_DETECTION_PROMPT).
+
+Usage: python scripts/train_intent_classifier.py --data labeled_replies.jsonl
+"""
+import os, sys, json, random, argparse
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from src.classifier import NaiveBayesIntentClassifier
+from src.utils import INTENT_CLASSIFIER_PATH
+
+def evaluate(classifier, examples, threshold):
+    confident, correct = 0, 0
+    for text, intent in examples:
+        prediction = classifier.predict(text)
+        if prediction and prediction[1] >= threshold:
+            confident += 1
+            correct += prediction[0] == intent
+    coverage = confident / len(examples) if examples else 0.0
+    precision = correct / confident if confident else 0.0
+    print(f"Threshold {threshold}: {coverage:.1%} of emails handled locally with {precision:.1%} precision")
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--data", required=True, help="JSONL file of labeled replies")
+    parser.add_argument("--output", default=INTENT_CLASSIFIER_PATH, help="Where to save the trained model")
+    parser.add_argument("--test-split", type=float, default=0.2, help="Fraction of examples kept for evaluation")
+    parser.add_argument("--threshold", type=float, default=float(os.getenv("LOCAL_CLASSIFIER_THRESHOLD", 0.9)))
+    args = parser.parse_args()
+
+    with open(args.data) as f:
+        examples = [(row["body"], row["intent"]) for row in map(json.loads, f) if row.get("body") and row.get("intent")]
+    print(f"Loaded {len(examples)} labeled replies")
+    
+    random.Random(0).shuffle(examples)
+    split = int(len(examples) * (1 - args.test_split))
+    evaluate(NaiveBayesIntentClassifier.train(examples[:split]), examples[split:], args.threshold)
+    
+    # Final model is trained on all examples
+    classifier = NaiveBayesIntentClassifier.train(examples)
+    classifier.save(args.output)
+    print(f"Model saved to {args.output}")
+
+if __name__ == "__main__":
+    main()
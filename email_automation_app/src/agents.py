@@ -1,41 +1,124 @@
+import os
 from langchain_core.prompts import ChatPromptTemplate
 from langchain_google_genai import ChatGoogleGenerativeAI, GoogleGenerativeAIEmbeddings
-from langchain_chroma import Chroma
-from langchain_core.output_parsers import StrOutputParser, JsonOutputParser
-from .utils import RAG_DATABASE_DIR
+from langchain_core.output_parsers import StrOutputParser, JsonOutputParser, PydanticOutputParser
+from .utils import RAG_DATABASE_DIR, LABEL_INDEX_FILE
+from .state import TriageResult
+from .store import LLMCacheStore
+from .cache import CachedChain, normalize_input, docs_writer_cache_key
+from .budget import BudgetedChain, TokenUsageLog
+from .tiering import ModelRouter, TieredChain
+from .retrieval import MultiQueryRetriever, LabelIndex
+from .vectorstores import load_vectorstore
 from .prompts import *
 
 class Agents():
-    def __init__(self):
-        flash = ChatGoogleGenerativeAI(model="gemini-1.5-flash", temperature=0.1)
-        gemini = ChatGoogleGenerativeAI(model="gemini-1.5-pro", temperature=0.1)
+    def __init__(self, flash=None, gemini=None, embeddings=None, rag_database_dir=RAG_DATABASE_DIR):
+        # Models can be injected, e.g. fake models for offline benchmarks
+        flash = flash or ChatGoogleGenerativeAI(model="gemini-1.5-flash", temperature=0.1)
+        gemini = gemini or ChatGoogleGenerativeAI(model="gemini-1.5-pro", temperature=0.1)
 
-        embeddings = GoogleGenerativeAIEmbeddings(model="models/text-embedding-004")
-        self.vectorstore = Chroma(persist_directory=RAG_DATABASE_DIR, embedding_function=embeddings)
+        embeddings = embeddings or GoogleGenerativeAIEmbeddings(model="models/text-embedding-004")
+        self.vectorstore = load_vectorstore(embeddings, rag_database_dir)
+        self.retriever = MultiQueryRetriever(
+            self.vectorstore, embeddings, k=2, 
+            label_index=LabelIndex(os.path.join(rag_database_dir, LABEL_INDEX_FILE))
+        )
+        
+        # Prompts are kept within per-chain token budgets, tokens are logged per chain & email
+        self.token_usage = TokenUsageLog()
+        # Draft chains run on flash for simple emails and escalate to pro when the draft is not valid
+        self.model_router = ModelRouter()
+        
+        # Emails that are not answered come back on every run, cache the triage chains outputs
+        # and the RAG context synthesized for each inquiry set
+        self.cached_chains = []
+        self.llm_cache = LLMCacheStore() if os.getenv("LLM_CACHE_ENABLED", "true") == "true" else None
         
         parser_prompt = ChatPromptTemplate.from_template(EMAIL_PARSER_PROMPT)
-        self.email_parse_chain = parser_prompt | flash | StrOutputParser()
+        self.email_parse_chain = self.cached("email_parse", EMAIL_PARSER_PROMPT, self.budgeted(
+            "email_parse", EMAIL_PARSER_PROMPT, parser_prompt | flash | StrOutputParser(), 
+            text_fields=["email_content"]
+        ))
         
         intent_prompt = ChatPromptTemplate.from_template(INTENT_DETECTION_PROMPT)
-        self.intent_detection_chain = intent_prompt | flash | JsonOutputParser()
+        self.intent_detection_chain = self.cached("intent_detection", INTENT_DETECTION_PROMPT, self.budgeted(
+            "intent_detection", INTENT_DETECTION_PROMPT, intent_prompt | flash | JsonOutputParser(), 
+            text_fields=["email_content"]
+        ))
 
         inquiry_prompt = ChatPromptTemplate.from_template(INQUIRY_EXTRACTION_PROMPT)
-        self.inquiry_extraction_chain = inquiry_prompt | flash | JsonOutputParser()
+        self.inquiry_extraction_chain = self.cached("inquiry_extraction", INQUIRY_EXTRACTION_PROMPT, self.budgeted(
+            "inquiry_extraction", INQUIRY_EXTRACTION_PROMPT, inquiry_prompt | flash | JsonOutputParser(), 
+            text_fields=["email_content"]
+        ))
+        
+        # Body, intent & inquiries of an email in a single call, output validated against TriageResult
+        triage_prompt = ChatPromptTemplate.from_template(TRIAGE_PROMPT)
+        self.triage_chain = self.cached("triage", TRIAGE_PROMPT, self.budgeted(
+            "triage", TRIAGE_PROMPT, 
+            triage_prompt | flash | PydanticOutputParser(pydantic_object=TriageResult) | (lambda result: result.model_dump()), 
+            text_fields=["email_content"]
+        ))
         
         docs_writer_prompt = ChatPromptTemplate.from_template(DOCS_WRITER_PROMPT)
-        self.docs_writer_chain = docs_writer_prompt | flash | StrOutputParser()
+        self.docs_writer_chain = self.cached("docs_writer", DOCS_WRITER_PROMPT, self.budgeted(
+            "docs_writer", DOCS_WRITER_PROMPT, docs_writer_prompt | flash | StrOutputParser(), 
+            documents_fields=["documents"]
+        ), key_fn=docs_writer_cache_key)
         
         standard_email_writer_prompt = ChatPromptTemplate.from_template(STANDARD_EMAIL_RESPONSE_PROMPT)
-        self.write_standard_email_chain = standard_email_writer_prompt | flash | StrOutputParser()
+        self.write_standard_email_chain = self.budgeted(
+            "write_standard_email", STANDARD_EMAIL_RESPONSE_PROMPT, standard_email_writer_prompt | flash | StrOutputParser()
+        )
         
         email_writer_prompt = ChatPromptTemplate.from_template(RAG_EMAIL_RESPONSE_PROMPT_TEMPLATE)
-        self.write_email_chain = email_writer_prompt | gemini | StrOutputParser()
+        self.write_email_chain = self.tiered("write_email", "email_content", *[
+            self.budgeted(
+                "write_email", RAG_EMAIL_RESPONSE_PROMPT_TEMPLATE, email_writer_prompt | model | StrOutputParser(), 
+                text_fields=["email_content"], context_fields=["context"]
+            )
+            for model in (flash, gemini)
+        ])
         
         update_info_prompt = ChatPromptTemplate.from_template(INFORMATION_UPDATER_PROMPT)
-        self.update_email_info_chain = update_info_prompt | flash | StrOutputParser()
+        self.update_email_info_chain = self.budgeted(
+            "update_email_info", INFORMATION_UPDATER_PROMPT, update_info_prompt | flash | StrOutputParser()
+        )
         
         email_editor_prompt = ChatPromptTemplate.from_template(EDITOR_EMAIL_ANALYSIS_PROMPT_TEMPLATE)
-        self.email_editor_chain = email_editor_prompt | flash | JsonOutputParser()
+        self.email_editor_chain = self.budgeted(
+            "email_editor", EDITOR_EMAIL_ANALYSIS_PROMPT_TEMPLATE, email_editor_prompt | flash | JsonOutputParser(), 
+            text_fields=["initial_email"]
+        )
         
         email_rewriter_prompt = ChatPromptTemplate.from_template(EMAIL_REWRITER_PROMPT_TEMPLATE)
-        self.email_rewriter_chain = email_rewriter_prompt | gemini | StrOutputParser()
\ No newline at end of file
+        self.email_rewriter_chain = self.tiered("email_rewriter", "initial_email", *[
+            self.budgeted(
+                "email_rewriter", EMAIL_REWRITER_PROMPT_TEMPLATE, email_rewriter_prompt | model | StrOutputParser(), 
+                text_fields=["initial_email"]
+            )
+            for model in (flash, gemini)
+        ])
+
+    def budgeted(self, name, prompt, chain, text_fields=(), documents_fields=(), context_fields=()):
+        return BudgetedChain(chain, name, prompt, self.token_usage, text_fields, documents_fields, context_fields)
+
+    def tiered(self, name, email_field, flash_chain, pro_chain):
+        return TieredChain(flash_chain, pro_chain, name, self.model_router, email_field)
+
+    def cached(self, name, prompt, chain, key_fn=normalize_input):
+        if self.llm_cache is None:
+            return chain
+        cached_chain = CachedChain(chain, name, prompt, self.llm_cache, key_fn=key_fn)
+        self.cached_chains.append(cached_chain)
+        return cached_chain
+
+    def get_cache_stats(self):
+        return {chain.name: chain.get_stats() for chain in self.cached_chains}
+
+    def get_token_stats(self):
+        return self.token_usage.get_stats()
+
+    def get_tier_stats(self):
+        return self.model_router.get_stats()
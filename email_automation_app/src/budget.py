@@ -0,0 +1,183 @@
+import os, re, json, math, time, threading
+from collections import defaultdict
+from langchain_core.runnables import Runnable, ensure_config
+from .metrics import CHAIN_LATENCY, CHAIN_TOKENS
+
+# Per-chain prompt budgets in estimated tokens, overridden with TOKEN_BUDGET_<CHAIN NAME>
+DEFAULT_TOKEN_BUDGETS = {
+    "email_parse": 2000,
+    "intent_detection": 1500,
+    "inquiry_extraction": 1500,
+    "triage": 2500,
+    "docs_writer": 3000,
+    "write_standard_email": 1000,
+    "write_email": 4000,
+    "update_email_info": 2000,
+    "email_editor": 3000,
+    "email_rewriter": 3000,
+}
+DOCUMENTS_SEPARATOR = "\n\n////////////\n\n"
+# The closing line of a reply is only looked for in its last non-empty lines
+SIGNATURE_SEARCH_LINES = 6
+
+DISCLAIMER_PATTERN = re.compile(
+    r"^[\*\s]*(?:CAUTION|Disclaimer|Warning|Confidential(?:ity)?|CONFIDENTIALITY|Hinweis|Achtung|Avertissement|Avviso)\b"
+    r"|^[\*\s]*(?:This (?:e-?mail|message) and any (?:files|attachments)|The information contained in this (?:e-?mail|message))",
+    re.IGNORECASE
+)
+CLOSING_PATTERN = re.compile(
+    r"^(?:Best|Kind|Warm|With best)?\s*(?:regards|wishes)\b|^(?:Sincerely|Yours|Cordially|Thanks|Thank you|Cheers|Best)\b[^\n]{0,20}$"
+    r"|^(?:Mit freundlichen Gr|Viele Gr|Cordialement|Bien à vous|Cordiali saluti|Distinti saluti|Saludos|Atentamente)",
+    re.IGNORECASE
+)
+
+def estimate_tokens(value):
+    """
+    Rough token count of a prompt input or output, about 4 characters per token.
+    """
+    if value is None:
+        return 0
+    if not isinstance(value, str):
+        value = json.dumps(value, default=str)
+    return math.ceil(len(value) / 4)
+
+def drop_disclaimers(text):
+    # Legal disclaimers are whole paragraphs appended by mail servers
+    paragraphs = text.split("\n\n")
+    return "\n\n".join(paragraph for paragraph in paragraphs if not DISCLAIMER_PATTERN.match(paragraph))
+
+def drop_signature(text):
+    """
+    Keep the closing line and the name after it, drop the rest of the signature
+    block (titles, addresses, phone numbers, links). The closing line is only looked 
+    for at the end of the text, a "Thanks" opening the reply is kept with what follows.
+    """
+    lines = text.split("\n")
+    last_lines = [i for i, line in enumerate(lines) if line.strip()][-SIGNATURE_SEARCH_LINES:]
+    for i in reversed(last_lines):
+        if i > 0 and CLOSING_PATTERN.match(lines[i].strip()):
+            return "\n".join(lines[:i + 2]).strip()
+    return text
+
+def dedupe_documents(documents):
+    chunks, seen = [], set()
+    for chunk in documents.split(DOCUMENTS_SEPARATOR):
+        key = re.sub(r"\s+", " ", chunk).strip().lower()
+        if key and key not in seen:
+            seen.add(key)
+            chunks.append(chunk)
+    return DOCUMENTS_SEPARATOR.join(chunks)
+
+def truncate_text(text, max_tokens):
+    return text[:max(max_tokens, 0) * 4]
+
+def truncate_documents(documents, max_tokens):
+    # Chunks are ordered by relevance, drop the last ones first
+    chunks = documents.split(DOCUMENTS_SEPARATOR)
+    while len(chunks) > 1 and estimate_tokens(DOCUMENTS_SEPARATOR.join(chunks)) > max_tokens:
+        chunks.pop()
+    return truncate_text(DOCUMENTS_SEPARATOR.join(chunks), max_tokens)
+
+# Lossless trims first, truncation last
+EMAIL_TRIMMERS = [drop_disclaimers, drop_signature]
+DOCUMENTS_TRIMMERS = [dedupe_documents]
+
+class TokenUsageLog:
+    def __init__(self):
+        """
+        Estimated tokens of the LLM calls, per chain and per email (`email_id` in the
+        run config metadata), with the seconds spent on each chain per email.
+        """
+        self.lock = threading.Lock()
+        self.per_chain = defaultdict(lambda: {"calls": 0, "input_tokens": 0, "output_tokens": 0, "trimmed_tokens": 0})
+        self.per_email = defaultdict(lambda: defaultdict(int))
+        self.per_email_seconds = defaultdict(lambda: defaultdict(float))
+
+    def record(self, chain, email_id, input_tokens, output_tokens, trimmed_tokens, duration=0.0):
+        with self.lock:
+            stats = self.per_chain[chain]
+            stats["calls"] += 1
+            stats["input_tokens"] += input_tokens
+            stats["output_tokens"] += output_tokens
+            stats["trimmed_tokens"] += trimmed_tokens
+            if email_id:
+                self.per_email[email_id][chain] += input_tokens + output_tokens
+                self.per_email_seconds[email_id][chain] += duration
+
+    def pop_email(self, email_id):
+        """
+        Returns the tokens and the seconds per chain of an email.
+        """
+        with self.lock:
+            return dict(self.per_email.pop(email_id, {})), dict(self.per_email_seconds.pop(email_id, {}))
+
+    def get_stats(self):
+        with self.lock:
+            return {chain: dict(stats) for chain, stats in self.per_chain.items()}
+
+class BudgetedChain(Runnable):
+    def __init__(self, chain, name, prompt, usage_log, text_fields=(), documents_fields=(), context_fields=(), budget=None):
+        """
+        Keep the prompt of a chain within its token budget: when the estimated prompt is
+        over budget, `text_fields` (inbound email text) and `documents_fields` (retrieved
+        chunks) are trimmed locally, then truncated as a last resort with `context_fields`
+        (generated text, e.g. the synthesized RAG context, never trimmed). Estimated tokens
+        of every call are recorded in `usage_log`. Batches go through the default 
+        Runnable.batch, which runs `invoke` in parallel, so each call is measured.
+        """
+        self.chain = chain
+        self.name = name
+        self.prompt_tokens = estimate_tokens(prompt)
+        self.usage_log = usage_log
+        self.text_fields = text_fields
+        self.documents_fields = documents_fields
+        self.context_fields = context_fields
+        self.budget = budget or int(os.getenv(f"TOKEN_BUDGET_{name.upper()}", DEFAULT_TOKEN_BUDGETS.get(name, 4000)))
+
+    def invoke(self, input, config=None, **kwargs):
+        config = ensure_config(config)
+        input, input_tokens, trimmed_tokens = self.fit(input)
+        start = time.perf_counter()
+        output = self.chain.invoke(input, config, **kwargs)
+        duration = time.perf_counter() - start
+        CHAIN_LATENCY.labels(self.name).observe(duration)
+        
+        output_tokens = estimate_tokens(output)
+        CHAIN_TOKENS.labels(self.name, "input").inc(input_tokens)
+        CHAIN_TOKENS.labels(self.name, "output").inc(output_tokens)
+        self.usage_log.record(self.name, config["metadata"].get("email_id"), input_tokens, output_tokens, trimmed_tokens, duration)
+        return output
+
+    def fit(self, input):
+        """
+        Returns the (possibly trimmed) input, its estimated prompt tokens and the tokens trimmed.
+        """
+        original_tokens = tokens = self.count_tokens(input)
+        if tokens <= self.budget:
+            return input, tokens, 0
+
+        input = dict(input)
+        stages = [(field, trimmer) for trimmer in EMAIL_TRIMMERS for field in self.text_fields]
+        stages += [(field, trimmer) for trimmer in DOCUMENTS_TRIMMERS for field in self.documents_fields]
+        for field, trimmer in stages:
+            input[field] = trimmer(input[field])
+            tokens = self.count_tokens(input)
+            if tokens <= self.budget:
+                break
+
+        # Still over budget, truncate the trimmable fields to share what is left
+        fields = list(self.documents_fields) + list(self.text_fields) + list(self.context_fields)
+        if tokens > self.budget and fields:
+            fixed_tokens = tokens - sum(estimate_tokens(input[field]) for field in fields)
+            field_budget = (self.budget - fixed_tokens) // len(fields)
+            for field in self.documents_fields:
+                input[field] = truncate_documents(input[field], field_budget)
+            for field in list(self.text_fields) + list(self.context_fields):
+                input[field] = truncate_text(input[field], field_budget)
+            tokens = self.count_tokens(input)
+
+        print(f"Trimmed {self.name} prompt from {original_tokens} to {tokens} tokens (budget: {self.budget})")
+        return input, tokens, original_tokens - tokens
+
+    def count_tokens(self, input):
+        return self.prompt_tokens + sum(estimate_tokens(value) for value in input.values())
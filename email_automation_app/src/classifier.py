@@ -0,0 +1,134 @@
+import os, re, json, math, threading
+from collections import Counter, defaultdict
+from .utils import INTENT_CLASSIFIER_PATH
+
+# (pattern, intent, confidence, max body length the rule applies to)
+# Body keywords are ambiguous ("no thanks needed, I am happy to submit"), only near-certain 
+# rules reach the default threshold, the others only apply with a lower LOCAL_CLASSIFIER_THRESHOLD
+INTENT_RULES = [
+    (r'This is a new submission for', "After submission", 1.0, None),
+    (r'\b(not interested|i (will|must|have to) decline)\b', "Not Interested", 0.8, 200),
+    (r'\b(already (been )?published|has already been published|was already published)\b', "Paper Already Published", 0.8, 300),
+]
+
+def tokenize(text):
+    words = re.findall(r"[^\W\d_]+", text.lower())
+    return words + [f"{a} {b}" for a, b in zip(words, words[1:])]
+
+class RuleBasedIntentClassifier:
+    name = "rules"
+
+    def __init__(self, rules=INTENT_RULES):
+        self.rules = [(re.compile(pattern, re.IGNORECASE), intent, confidence, max_length) for pattern, intent, confidence, max_length in rules]
+
+    def predict(self, text):
+        for pattern, intent, confidence, max_length in self.rules:
+            if max_length is not None and len(text) > max_length:
+                continue
+            if pattern.search(text):
+                return intent, confidence
+        return None
+
+class NaiveBayesIntentClassifier:
+    name = "naive_bayes"
+
+    def __init__(self, model):
+        """
+        Multinomial naive Bayes over words & bigrams, trained on past labeled replies.
+        """
+        self.model = model
+        self.vocabulary = set().union(*model["log_likelihoods"].values())
+
+    @classmethod
+    def train(cls, examples, alpha=1.0):
+        """
+        Train the model from a list of (email body, intent) pairs.
+        """
+        class_counts = Counter()
+        token_counts = defaultdict(Counter)
+        for text, intent in examples:
+            class_counts[intent] += 1
+            token_counts[intent].update(tokenize(text))
+        
+        vocabulary = set().union(*token_counts.values())
+        model = {"priors": {}, "log_likelihoods": {}, "unknown": {}}
+        for intent, count in class_counts.items():
+            total = sum(token_counts[intent].values()) + alpha * len(vocabulary)
+            model["priors"][intent] = math.log(count / sum(class_counts.values()))
+            model["log_likelihoods"][intent] = {
+                token: math.log((token_count + alpha) / total) for token, token_count in token_counts[intent].items()
+            }
+            model["unknown"][intent] = math.log(alpha / total)
+        return cls(model)
+
+    @classmethod
+    def load(cls, path):
+        with open(path) as f:
+            return cls(json.load(f))
+
+    def save(self, path):
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        with open(path, "w") as f:
+            json.dump(self.model, f)
+
+    def predict(self, text):
+        tokens = [token for token in tokenize(text) if token in self.vocabulary]
+        if not tokens:
+            return None
+        
+        scores = {}
+        for intent, prior in self.model["priors"].items():
+            likelihoods, unknown = self.model["log_likelihoods"][intent], self.model["unknown"][intent]
+            scores[intent] = prior + sum(likelihoods.get(token, unknown) for token in tokens)
+        
+        # Normalize log scores into a posterior probability for the best intent
+        best_intent = max(scores, key=scores.get)
+        total = sum(math.exp(score - scores[best_intent]) for score in scores.values())
+        return best_intent, 1 / total
+
+class LocalIntentClassifier:
+    def __init__(self, classifiers=None, threshold=None):
+        """
+        Fast local intent detection ahead of the intent LLM: classifiers (any object with a 
+        `name` and a `predict(text)` method returning (intent, confidence) or None) are tried 
+        in order and the first prediction reaching the confidence `threshold` is kept.
+        """
+        if classifiers is None:
+            classifiers = [RuleBasedIntentClassifier()]
+            if os.path.exists(INTENT_CLASSIFIER_PATH):
+                classifiers.append(NaiveBayesIntentClassifier.load(INTENT_CLASSIFIER_PATH))
+            else:
+                # No model is shipped, it is trained on the inbox's own labeled replies
+                print(
+                    f"No local intent classifier at {INTENT_CLASSIFIER_PATH}, only the submission rule skips "
+                    "the intent LLM. Train one with scripts/train_intent_classifier.py"
+                )
+        self.classifiers = classifiers
+        self.threshold = threshold or float(os.getenv("LOCAL_CLASSIFIER_THRESHOLD", 0.9))
+        self.stats = Counter()
+        self.lock = threading.Lock()
+
+    def classify(self, text):
+        """
+        Returns (intent, confidence) or None when the email must go to the intent LLM.
+        """
+        for classifier in self.classifiers:
+            prediction = classifier.predict(text)
+            # Unrelated emails are skipped for good, only the LLM can decide it
+            if prediction and prediction[0] == "Unrelated":
+                continue
+            if prediction and prediction[1] >= self.threshold:
+                self._count(classifier.name)
+                return prediction
+        self._count("llm")
+        return None
+
+    def get_stats(self):
+        with self.lock:
+            stats = dict(self.stats)
+        stats["llm_calls_saved"] = sum(count for source, count in stats.items() if source != "llm")
+        return stats
+
+    def _count(self, source):
+        with self.lock:
+            self.stats[source] += 1
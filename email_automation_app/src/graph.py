@@ -1,48 +1,105 @@
+import time, inspect
 from langgraph.graph import END, StateGraph
-from .state import GraphState
+from langgraph.config import get_stream_writer
+from .state import GraphState, EmailState, EmailOutputState
 from .nodes import Nodes
+from .metrics import NODE_LATENCY
+
+def timed_node(name, node, email_events=False):
+    """
+    Wrap a node to record its duration in the node latency metric and report it as a 
+    compact event on the custom stream, with `email_events` one event per email result it returns.
+    Events are only emitted when the graph is streamed with stream_mode="custom".
+    """
+    takes_config = "config" in inspect.signature(node).parameters
+    
+    def run(state, config):
+        start = time.perf_counter()
+        output = node(state, config) if takes_config else node(state)
+        duration = time.perf_counter() - start
+        duration_ms = round(duration * 1000, 1)
+        NODE_LATENCY.labels(name).observe(duration)
+        
+        writer = get_stream_writer()
+        current_email = state.get("current_email")
+        writer({
+            "event": "node",
+            "inbox": state["inbox"],
+            "node": name,
+            "thread_id": current_email.threadId if current_email else None,
+            "duration_ms": duration_ms
+        })
+        for result in (output or {}).get("results", []) if email_events else []:
+            writer({
+                "event": "email",
+                "inbox": state["inbox"],
+                "thread_id": result["threadId"],
+                "id": result["id"],
+                "category": result["category"],
+                "outcome": result["outcome"],
+                "draft_created": result["draft_created"],
+                "tokens": result["tokens"],
+                "triage": result["triage"],
+                "duration_ms": duration_ms
+            })
+        return output
+    return run
+
+def add_timed_node(workflow, name, node, email_events=False):
+    workflow.add_node(name, timed_node(name, node, email_events))
 
 class Workflow():
-    def __init__(self):
+    def __init__(self, nodes=None):
         # initiate graph state & nodes
         workflow = StateGraph(GraphState)
-        nodes = Nodes()
+        nodes = nodes or Nodes()
+        self.nodes = nodes
         
         # define all graph nodes
-        workflow.add_node("process_email_inbox", nodes.process_email_inbox)
-        workflow.add_node("load_new_emails", nodes.load_new_emails)
-        workflow.add_node("is_email_inbox_empty", nodes.is_email_inbox_empty)
-        workflow.add_node("categorize_email_intent", nodes.categorize_email_intent)
-        workflow.add_node("extract_email_inquiries", nodes.extract_email_inquiries)
-        workflow.add_node("retrieve_docs_from_rag", nodes.retrieve_docs_from_rag)
-        workflow.add_node("generate_standard_draft_reply", nodes.generate_standard_draft_reply)
-        workflow.add_node("generate_draft_reply", nodes.generate_draft_reply)
-        workflow.add_node("create_draft_response", nodes.create_draft_response)
-        workflow.add_node("skip_unrelated_email", nodes.skip_unrelated_email)
+        add_timed_node(workflow, "load_new_emails", nodes.load_new_emails)
+        add_timed_node(workflow, "categorize_emails", nodes.categorize_emails)
+        self.email_app = self._build_email_graph(nodes)
+        add_timed_node(workflow, "process_email", self.process_email, email_events=True)
         
-        # Set entry point
-        workflow.set_entry_point("process_email_inbox")
+        # Set entry point: each run of the graph processes a batch of emails from a single inbox
+        workflow.set_entry_point("load_new_emails")
         
-        # Add edges for inbox processing
-        workflow.add_conditional_edges(
-            "process_email_inbox",
-            nodes.process_email_inbox,
-            {
-                "continue": "load_new_emails",
-                "complete": END
-            }
-        )
+        # Add edges for email loading & categorization
+        workflow.add_edge("load_new_emails", "categorize_emails")
         
-        # Add edges for email loading
-        workflow.add_edge("load_new_emails", "is_email_inbox_empty")
-        workflow.add_conditional_edges(
-            "is_email_inbox_empty",
-            nodes.check_new_emails,
-            {
-                "continue": "categorize_email_intent",
-                "empty": "process_email_inbox"
-            }
-        )
+        # Map: send each email to its own processing branch, branches run in parallel
+        workflow.add_conditional_edges("categorize_emails", nodes.dispatch_emails, ["process_email", END])
+        
+        # Reduce: branch results are collected into the `results` state key
+        workflow.add_edge("process_email", END)
+        
+        # Compile
+        self.app = workflow.compile()
+
+    def process_email(self, state, config):
+        # An error on one email must not fail the other branches of the batch
+        try:
+            # LLM calls of the email branch are attributed to the email in the token log
+            config = {**config, "metadata": {**config.get("metadata", {}), "email_id": state["current_email"].id}}
+            return self.email_app.invoke(state, config)
+        except Exception as error:
+            return self.nodes.skip_failed_email(state, error)
+
+    def _build_email_graph(self, nodes):
+        # Processing of a single email, from routing to draft creation
+        workflow = StateGraph(EmailState, output_schema=EmailOutputState)
+        
+        # define all graph nodes
+        add_timed_node(workflow, "categorize_email_intent", nodes.categorize_email_intent)
+        add_timed_node(workflow, "extract_email_inquiries", nodes.extract_email_inquiries)
+        add_timed_node(workflow, "retrieve_docs_from_rag", nodes.retrieve_docs_from_rag)
+        add_timed_node(workflow, "generate_standard_draft_reply", nodes.generate_standard_draft_reply)
+        add_timed_node(workflow, "generate_draft_reply", nodes.generate_draft_reply)
+        add_timed_node(workflow, "create_draft_response", nodes.create_draft_response)
+        add_timed_node(workflow, "skip_unrelated_email", nodes.skip_unrelated_email)
+        
+        # Set entry point
+        workflow.set_entry_point("categorize_email_intent")
         
         # Add edges for email categorization and routing
         workflow.add_conditional_edges(
@@ -83,9 +140,8 @@ class Workflow():
         # workflow.add_edge("rewrite_email_from_feedback", "review_generated_draft")
         # ///////////////////////////////////////////////////
         
-        # Add edges for continuing to next email
-        workflow.add_edge("create_draft_response", "is_email_inbox_empty")
-        workflow.add_edge("skip_unrelated_email", "is_email_inbox_empty")
+        # Email processing ends once the draft is created or the email is skipped
+        workflow.add_edge("create_draft_response", END)
+        workflow.add_edge("skip_unrelated_email", END)
         
-        # Compile
-        self.app = workflow.compile()
\ No newline at end of file
+        return workflow.compile()
@@ -0,0 +1,143 @@
+import os, time, hashlib
+from concurrent.futures import ThreadPoolExecutor
+from langchain_text_splitters import RecursiveCharacterTextSplitter
+from .utils import LABEL_INDEX_FILE
+from langchain_chroma import Chroma
+from .retrieval import MultiQueryRetriever, LabelIndex, get_indexed_ids, vectorstore_fingerprint
+
+SOURCE_EXTENSIONS = (".txt", ".md")
+EMBEDDING_BATCH_SIZE = int(os.getenv("EMBEDDING_BATCH_SIZE", 100))
+EMBEDDING_WORKERS = int(os.getenv("EMBEDDING_WORKERS", 4))
+# Sources are named relative to the repository root, chunk ids must not depend on the working directory
+SOURCE_ROOT = os.getenv(
+    "INDEX_SOURCE_ROOT", 
+    os.path.dirname(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+)
+
+def chunk_id(source, content):
+    return hashlib.sha256(f"{source}\n{content}".encode()).hexdigest()
+
+def list_source_files(paths):
+    """
+    Expand the given files and directories into the list of source files to index.
+    """
+    files = []
+    for path in paths:
+        if os.path.isdir(path):
+            for root, _, names in os.walk(path):
+                files.extend(os.path.join(root, name) for name in names if name.endswith(SOURCE_EXTENSIONS))
+        else:
+            files.append(path)
+    return sorted(set(files))
+
+def split_source(path, chunk_size=200, chunk_overlap=50, separator=None, source_root=SOURCE_ROOT):
+    """
+    Split a source file into chunks, either one chunk per record when a separator
+    is given or with the recursive splitter. Returns {chunk_id: (content, metadata)}.
+    """
+    with open(path, encoding="utf-8") as f:
+        text = f.read()
+    if separator:
+        contents = [record.strip() for record in text.split(separator)]
+    else:
+        splitter = RecursiveCharacterTextSplitter(chunk_size=chunk_size, chunk_overlap=chunk_overlap)
+        contents = splitter.split_text(text)
+
+    source = os.path.relpath(os.path.abspath(path), source_root)
+    return {
+        chunk_id(source, content): (content, {"source": source})
+        for content in contents if content
+    }
+
+class IndexBuilder:
+    def __init__(self, vectorstore, embeddings, batch_size=EMBEDDING_BATCH_SIZE, workers=EMBEDDING_WORKERS):
+        """
+        Keep the vector store in sync with the source files: chunks are identified by
+        a hash of their source and content, so only new or changed chunks are embedded.
+        """
+        self.vectorstore = vectorstore
+        self.embeddings = embeddings
+        self.batch_size = batch_size
+        self.workers = workers
+
+    def sync(self, chunks):
+        """
+        Upsert the chunks missing from the store and delete the indexed chunks that
+        are no longer in `chunks`. Returns the added, deleted and unchanged counts.
+        """
+        indexed_ids = set(get_indexed_ids(self.vectorstore))
+        new_ids = [id for id in chunks if id not in indexed_ids]
+        stale_ids = [id for id in indexed_ids if id not in chunks]
+
+        if new_ids:
+            self.upsert(new_ids, chunks, stale_ids)
+        elif stale_ids:
+            self.vectorstore.delete(ids=stale_ids)
+        return {
+            "added": len(new_ids),
+            "deleted": len(stale_ids),
+            "unchanged": len(chunks) - len(new_ids)
+        }
+
+    def upsert(self, ids, chunks, stale_ids=()):
+        """
+        Embed and upsert the chunks of `ids`, then delete the chunks of `stale_ids`.
+        """
+        batches = [ids[i:i + self.batch_size] for i in range(0, len(ids), self.batch_size)]
+        print(f"Embedding {len(ids)} chunks in {len(batches)} batches...")
+        with ThreadPoolExecutor(max_workers=self.workers) as executor:
+            vectors = executor.map(
+                lambda batch: self.embeddings.embed_documents([chunks[id][0] for id in batch]), batches
+            )
+            vectors = list(vectors)
+        
+        if isinstance(self.vectorstore, Chroma):
+            for batch, batch_vectors in zip(batches, vectors):
+                self.vectorstore._collection.upsert(
+                    ids=batch,
+                    embeddings=batch_vectors,
+                    documents=[chunks[id][0] for id in batch],
+                    metadatas=[chunks[id][1] for id in batch]
+                )
+            if stale_ids:
+                self.vectorstore.delete(ids=stale_ids)
+        else:
+            # The NumPy store rewrites its matrix on each write, a sync is a single write
+            self.vectorstore.upsert_vectors(
+                ids, 
+                [vector for batch_vectors in vectors for vector in batch_vectors],
+                [chunks[id][0] for id in ids],
+                [chunks[id][1] for id in ids],
+                delete_ids=stale_ids
+            )
+
+    def build_label_index(self, persist_directory, k=2):
+        """
+        Precompute the inquiry label results for the current database content.
+        """
+        retriever = MultiQueryRetriever(self.vectorstore, self.embeddings, k=k)
+        label_index = LabelIndex(os.path.join(persist_directory, LABEL_INDEX_FILE))
+        label_index.build(retriever, vectorstore_fingerprint(self.vectorstore))
+
+def build_index(vectorstore, embeddings, sources, persist_directory, chunk_size=200, chunk_overlap=50,
+                separator=None, batch_size=EMBEDDING_BATCH_SIZE, workers=EMBEDDING_WORKERS, source_root=SOURCE_ROOT):
+    """
+    Incrementally index the source files into the vector store, the store mirrors the
+    given sources: chunks of any other source are deleted.
+    """
+    start = time.perf_counter()
+    chunks = {}
+    source_files = list_source_files(sources)
+    for path in source_files:
+        chunks.update(split_source(path, chunk_size, chunk_overlap, separator, source_root))
+    print(f"Loaded {len(chunks)} chunks from {len(source_files)} source files")
+
+    builder = IndexBuilder(vectorstore, embeddings, batch_size, workers)
+    report = builder.sync(chunks)
+
+    label_index_path = os.path.join(persist_directory, LABEL_INDEX_FILE)
+    if report["added"] or report["deleted"] or not os.path.exists(label_index_path):
+        builder.build_label_index(persist_directory)
+
+    report["duration"] = round(time.perf_counter() - start, 2)
+    return report
@@ -0,0 +1,90 @@
+import os, time, uuid, threading
+from concurrent.futures import ThreadPoolExecutor
+
+class JobManager:
+    def __init__(self, max_concurrent_jobs=None, max_finished_jobs=100):
+        """
+        Run workflow jobs on a worker pool, off the API event loop. At most 
+        `max_concurrent_jobs` run at the same time, the others wait in the queue.
+        Streamed runs take a slot too, they are rejected when none is free.
+        """
+        self.max_concurrent_jobs = max_concurrent_jobs or int(os.getenv("MAX_CONCURRENT_JOBS", 1))
+        self.max_finished_jobs = max_finished_jobs
+        self.slots = threading.BoundedSemaphore(self.max_concurrent_jobs)
+        self.executor = ThreadPoolExecutor(max_workers=self.max_concurrent_jobs, thread_name_prefix="workflow-job")
+        self.jobs = {}
+        self.lock = threading.Lock()
+
+    def submit(self, func, *args, **kwargs):
+        job_id = uuid.uuid4().hex
+        job = {
+            "job_id": job_id,
+            "status": "queued",
+            "created_at": time.time(),
+            "started_at": None,
+            "finished_at": None,
+            "result": None,
+            "error": None
+        }
+        with self.lock:
+            self.jobs[job_id] = job
+            self._prune_finished_jobs()
+        self.executor.submit(self._run_job, job, func, *args, **kwargs)
+        return self.get_status(job_id)
+
+    def has_free_slot(self):
+        # Semaphores don't expose their value, take a slot and give it back
+        if not self.slots.acquire(blocking=False):
+            return False
+        self.slots.release()
+        return True
+
+    def stream(self, events, busy_event=None):
+        """
+        Run a streamed workflow run (a generator of events) in a job slot. The slot is 
+        only taken once the stream is iterated, and released when it ends or is closed,
+        so a stream dropped before it started never holds one. When all slots are taken, 
+        only `busy_event` is yielded.
+        """
+        if not self.slots.acquire(blocking=False):
+            if busy_event is not None:
+                yield busy_event
+            return
+        try:
+            yield from events
+        finally:
+            self.slots.release()
+
+    def get(self, job_id):
+        with self.lock:
+            return self.jobs.get(job_id)
+
+    def get_status(self, job_id):
+        job = self.get(job_id)
+        if job is None:
+            return None
+        return {key: value for key, value in job.items() if key != "result"}
+
+    def shutdown(self):
+        self.executor.shutdown(wait=False, cancel_futures=True)
+
+    def _run_job(self, job, func, *args, **kwargs):
+        # Wait for the streamed runs holding a slot
+        with self.slots:
+            job["status"] = "running"
+            job["started_at"] = time.time()
+            try:
+                job["result"] = func(*args, **kwargs)
+                job["status"] = "completed"
+            except Exception as e:
+                print(f"An error occurred while running job {job['job_id']}: {e}")
+                job["error"] = str(e)
+                job["status"] = "failed"
+            job["finished_at"] = time.time()
+
+    def _prune_finished_jobs(self):
+        # Only keep the most recent finished jobs in memory
+        finished = [job for job in self.jobs.values() if job["finished_at"] is not None]
+        finished.sort(key=lambda job: job["finished_at"])
+        for job in finished[:max(0, len(finished) - self.max_finished_jobs)]:
+            del self.jobs[job["job_id"]]
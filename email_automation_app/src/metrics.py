@@ -0,0 +1,49 @@
+from prometheus_client import Counter, Gauge, Histogram, generate_latest, CONTENT_TYPE_LATEST
+
+# Metrics are only aggregated in memory, they are serialized when /metrics is scraped
+NODE_LATENCY = Histogram(
+    "email_automation_node_duration_seconds", "Duration of graph node runs", ["node"],
+    buckets=(0.01, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30, 60)
+)
+CHAIN_LATENCY = Histogram(
+    "email_automation_chain_duration_seconds", "Duration of LLM chain calls", ["chain"],
+    buckets=(0.1, 0.25, 0.5, 1, 2, 4, 8, 15, 30, 60)
+)
+CHAIN_TOKENS = Counter(
+    "email_automation_chain_tokens", "Estimated LLM tokens of chain calls", ["chain", "direction"]
+)
+GOOGLE_API_CALLS = Counter(
+    "email_automation_google_api_calls", "Google API calls, batched sub-requests counted by their own method", ["api", "inbox", "method"]
+)
+GOOGLE_API_ERRORS = Counter(
+    "email_automation_google_api_errors", "Failed Google API calls", ["api", "inbox", "method"]
+)
+EMAILS_PROCESSED = Counter(
+    "email_automation_emails_processed", "Processed emails", ["inbox", "category", "outcome"]
+)
+# "slots" filled locally, or "llm" when the writer left out a slot
+DRAFT_INFO_UPDATES = Counter(
+    "email_automation_draft_info_updates", "Latest costs & deadlines added to RAG drafts", ["method"]
+)
+# LLM seconds spent on the parse, intent & inquiry calls of an email, per triage path
+TRIAGE_LATENCY = Histogram(
+    "email_automation_triage_duration_seconds", "LLM time spent triaging an email", ["triage"],
+    buckets=(0.1, 0.25, 0.5, 1, 2, 4, 8, 15, 30)
+)
+MODEL_TIER_CALLS = Counter(
+    "email_automation_model_tier_calls", "Draft chain calls per model tier and routing reason", ["chain", "tier", "reason"]
+)
+MODEL_TIER_LATENCY = Histogram(
+    "email_automation_model_tier_duration_seconds", "Duration of draft chain calls per model", ["chain", "model"],
+    buckets=(0.1, 0.25, 0.5, 1, 2, 4, 8, 15, 30, 60)
+)
+# Net of the flash calls wasted on escalated drafts, so it can decrease
+MODEL_TIER_LATENCY_SAVED = Gauge(
+    "email_automation_model_tier_latency_saved_seconds", "Estimated latency saved by flash drafts", ["chain"]
+)
+
+def export_metrics():
+    """
+    Returns the Prometheus text exposition of all metrics and its content type.
+    """
+    return generate_latest(), CONTENT_TYPE_LATEST
@@ -1,79 +1,237 @@
-import os, re
+import os, time, hashlib, threading
+from collections import defaultdict
+from langgraph.graph import END
+from langgraph.types import Send
 from .agents import Agents
+from .classifier import LocalIntentClassifier
 from .tools.GoogleAPITools import GmailToolsClass, GoogleSheetsToolsClass
-from .state import Email
+from .store import (
+    SyncCheckpointStore,
+    DraftIndexStore,
+    MessageLedgerStore,
+    OUTCOME_DRAFTED,
+    OUTCOME_SENT,
+    OUTCOME_SKIPPED_UNRELATED,
+    OUTCOME_SKIPPED_OWN,
+    OUTCOME_FAILED
+)
+from .state import create_email_state
+from .metrics import EMAILS_PROCESSED, TRIAGE_LATENCY, DRAFT_INFO_UPDATES
+from .prompts import TRIAGE_CLEAN_BODY, TRIAGE_KEEP_BODY
 from .utils import (
     STANDARD_REPLIES_TEMPLATES,
     extract_response,
+    fill_update_slots,
     compose_update_information
 )
 
-EMAIL_INBOXES = ["editorials@nabpress.com", "journals@nabpress.com"]
+# How long journal prices fetched from Google Sheets are reused before refreshing them
+JOURNAL_PRICES_TTL_SECONDS = int(os.getenv("JOURNAL_PRICES_TTL_SECONDS", 900))
+
+RAG_CATEGORIES = ["Want to Publish", "Share Another Paper"]
+
+# "separate" parse, intent & inquiry calls, a single "combined" triage call, or "ab" to split emails between both
+TRIAGE_MODE = os.getenv("TRIAGE_MODE", "separate")
+TRIAGE_SEPARATE, TRIAGE_COMBINED = "separate", "combined"
+TRIAGE_CHAINS = ["email_parse", "intent_detection", "inquiry_extraction", "triage"]
 
 class Nodes:
-    def __init__(self):
-        self.agents = Agents()
+    def __init__(self, agents=None, sheet_tools=None, gmail_tools_factory=None):
+        """
+        Google services and models can be injected, e.g. fakes for offline benchmarks:
+        `gmail_tools_factory(inbox, **kwargs)` builds the Gmail tools of an inbox.
+        """
+        self.agents = agents or Agents()
+        self.local_classifier = LocalIntentClassifier()
         
-        # Initialize Gmail tools for each inbox
-        self.gmail_tools = {
-            inbox: GmailToolsClass(inbox)
-            for inbox in EMAIL_INBOXES
-        }
-        self.current_inbox_index = 0
+        # Gmail tools are created lazily, one per inbox
+        self.gmail_tools_factory = gmail_tools_factory or GmailToolsClass
+        self.gmail_tools = {}
+        self.gmail_tools_lock = threading.Lock()
+        # Only one run at a time can process a given inbox
+        self.inbox_locks = defaultdict(threading.Lock)
+        self.sync_checkpoints = SyncCheckpointStore() if os.getenv("GMAIL_SYNC_MODE") == "incremental" else None
+        self.draft_index = DraftIndexStore()
+        self.ledger = MessageLedgerStore()
         
-        self.sheet_tools = GoogleSheetsToolsClass(
+        self.sheet_tools = sheet_tools or GoogleSheetsToolsClass(
             sheet_id='1G05gQG02uiOUPT1cGx3X5QCdnzkfrEKY8Ziu49zRZSw', 
             range_name='Sheet1!A2:B11'
         )
         self.journal_prices = self.sheet_tools.fetch_sheet_data()
-
-    def process_email_inbox(self, state):
-        if self.current_inbox_index >= len(EMAIL_INBOXES):
-            print("All inboxes processed")
-            return "complete"
+        self.journal_prices_fetched_at = time.time()
+        self.journal_prices_lock = threading.Lock()
         
-        current_inbox = EMAIL_INBOXES[self.current_inbox_index]
-        print(f"\nProcessing inbox: {current_inbox}\n")
-        return "continue"
+        # Limit the number of parallel LLM calls when processing a batch of emails
+        self.llm_batch_config = {"max_concurrency": int(os.getenv("LLM_MAX_CONCURRENCY", 8))}
+
+    def get_gmail_tools(self, inbox):
+        with self.gmail_tools_lock:
+            if inbox not in self.gmail_tools:
+                self.gmail_tools[inbox] = self.gmail_tools_factory(
+                    inbox, 
+                    checkpoints=self.sync_checkpoints, 
+                    draft_index=self.draft_index, 
+                    ledger=self.ledger
+                )
+            return self.gmail_tools[inbox]
+
+    def get_inbox_lock(self, inbox):
+        with self.gmail_tools_lock:
+            return self.inbox_locks[inbox]
+
+    def get_batch_configs(self, emails):
+        # One config per email, LLM tokens are logged per email
+        return [{**self.llm_batch_config, "metadata": {"email_id": email.id}} for email in emails]
+
+    def get_triage_mode(self, email):
+        if TRIAGE_MODE == "ab":
+            # Stable split on the message id, an email stays in the same arm across runs
+            return TRIAGE_COMBINED if int(hashlib.sha256(email.id.encode()).hexdigest(), 16) % 2 else TRIAGE_SEPARATE
+        return TRIAGE_COMBINED if TRIAGE_MODE == TRIAGE_COMBINED else TRIAGE_SEPARATE
+
+    def get_journal_prices(self):
+        with self.journal_prices_lock:
+            if time.time() - self.journal_prices_fetched_at > JOURNAL_PRICES_TTL_SECONDS:
+                # Keep the previous prices if the sheet can't be fetched
+                self.journal_prices = self.sheet_tools.fetch_sheet_data() or self.journal_prices
+                self.journal_prices_fetched_at = time.time()
+            return self.journal_prices
         
     def load_new_emails(self, state):
-        print("Loading new emails...\n")
-        current_inbox = EMAIL_INBOXES[self.current_inbox_index]
-        recent_emails = self.gmail_tools[current_inbox].fetch_unreplied_threads()
+        # Emails are streamed in batches from the inbox by the scheduler
+        current_inbox = state["inbox"]
+        print(f"Loading {len(state['emails'])} new emails from {current_inbox}...\n")
         # Only keep received emails
-        emails = [Email(**email) for email in recent_emails if (current_inbox not in email['sender_email'])]
+        emails = [email for email in state["emails"] if (current_inbox not in email.sender_email)]
+        sent_emails = [(email.id, email.threadId) for email in state["emails"] if (current_inbox in email.sender_email)]
+        self.ledger.record_many(current_inbox, sent_emails, OUTCOME_SKIPPED_OWN)
         return {"emails": emails}
     
-    def check_new_emails(self, state):
+    def dispatch_emails(self, state):
         number_emails = len(state['emails'])
         if number_emails == 0:
-            print("No new emails in current inbox")
-            self.current_inbox_index += 1
-            return "empty"
-        else:
-            print(f"{number_emails} new emails to process")
-            return "continue"
+            print(f"No new emails in {state['inbox']}")
+            return END
         
-    def is_email_inbox_empty(self, state):
-        return state
+        # Fan out: each email is processed in its own parallel branch
+        print(f"{number_emails} new emails to process")
+        return [
+            Send("process_email", create_email_state(
+                state["inbox"], email, state["email_categories"].get(email.id, ""),
+                state["category_confidences"].get(email.id),
+                self.get_triage_mode(email),
+                state["triaged_inquiries"].get(email.id)
+            ))
+            for email in state["emails"]
+        ]
+
+    def categorize_emails(self, state):
+        print(f"Checking category of {len(state['emails'])} emails...\n")
+        email_categories, category_confidences = {}, {}
+        emails_to_classify, emails_to_parse = [], []
+        for email in state["emails"]:
+            # Confident local predictions skip the intent LLM
+            prediction = self.local_classifier.classify(email.body)
+            if prediction is None:
+                emails_to_classify.append(email)
+                emails_to_parse.append(email)
+                continue
+            email_categories[email.id], category_confidences[email.id] = prediction
+            # The email body is only used again to write RAG based replies
+            if prediction[0] in RAG_CATEGORIES:
+                emails_to_parse.append(email)
+        print(f"{len(email_categories)} emails categorized locally, {len(emails_to_classify)} sent to LLM")
+        
+        # Emails of the combined triage arm are cleaned, categorized & get their inquiries in one call,
+        # the ones that fail go through the separate calls
+        triaged_inquiries = self.triage_emails(
+            [email for email in emails_to_parse if self.get_triage_mode(email) == TRIAGE_COMBINED], email_categories
+        )
+        emails_to_parse = [email for email in emails_to_parse if email.id not in triaged_inquiries]
+        emails_to_classify = [email for email in emails_to_classify if email.id not in triaged_inquiries]
+        
+        # Clean all bodies then detect remaining intents in parallel LLM calls
+        self.parse_emails_content(emails_to_parse)
+        category_results = self.agents.intent_detection_chain.batch(
+            [{"email_content": email.body} for email in emails_to_classify],
+            config=self.get_batch_configs(emails_to_classify),
+            return_exceptions=True
+        )
+        for email, category_result in zip(emails_to_classify, category_results):
+            if isinstance(category_result, Exception):
+                print(f"Could not categorize email {email.id}: {category_result}")
+                continue
+            email_categories[email.id] = category_result["intent"]
+        return {
+            "emails": state["emails"], 
+            "email_categories": email_categories, 
+            "category_confidences": category_confidences,
+            "triaged_inquiries": triaged_inquiries
+        }
+
+    def triage_emails(self, emails, email_categories):
+        """
+        Clean the body, detect the intent and extract the inquiries of each email in a single 
+        call. Local intent predictions already in `email_categories` are kept. 
+        Returns the inquiries of the triaged emails.
+        """
+        if not emails:
+            return {}
+        for email in emails:
+            if len(email.body) <= 30:
+                email.body = self.parse_email_content(email.body)
+        
+        # As with the separate calls, only long emails get their body cleaned
+        triage_results = self.agents.triage_chain.batch(
+            [
+                {
+                    "email_content": email.body,
+                    "body_instruction": TRIAGE_CLEAN_BODY if len(email.body) > 1000 else TRIAGE_KEEP_BODY
+                }
+                for email in emails
+            ],
+            config=self.get_batch_configs(emails),
+            return_exceptions=True
+        )
+        triaged_inquiries = {}
+        for email, triage_result in zip(emails, triage_results):
+            if isinstance(triage_result, Exception):
+                print(f"Could not triage email {email.id}: {triage_result}")
+                continue
+            if len(email.body) > 1000 and triage_result["body"]:
+                email.body = triage_result["body"]
+            email_categories.setdefault(email.id, triage_result["intent"])
+            triaged_inquiries[email.id] = triage_result["inquiries"]
+        print(f"{len(triaged_inquiries)}/{len(emails)} emails triaged in a single call")
+        return triaged_inquiries
 
     def categorize_email_intent(self, state):
-        print("Checking email category...\n")
-        current_email = state["emails"][-1]
-        if_submission_msg = bool(re.search(r'This is a new submission for', current_email.body))
-        email_intent = ""
-        if if_submission_msg:
-            email_intent = "After submission"
-        else:
-            email_body = self.parse_email_content(current_email.body)
-            current_email.body = email_body
-            category_result = self.agents.intent_detection_chain.invoke({"email_content": email_body})
+        current_email = state["current_email"]
+        email_intent = state["email_category"]
+        if not email_intent:
+            # Batch categorization failed for this email, retry it on its own
+            category_result = self.agents.intent_detection_chain.invoke({"email_content": current_email.body})
             email_intent = category_result["intent"]
         print("Email category:", email_intent)
-        return { 
-            "email_category": email_intent,
-            "current_email": current_email
-        }
+        return {"email_category": email_intent}
+
+    def parse_emails_content(self, emails):
+        # Short emails only get context added, long ones are cleaned by the parser chain
+        for email in emails:
+            if len(email.body) <= 30:
+                email.body = self.parse_email_content(email.body)
+        
+        long_emails = [email for email in emails if len(email.body) > 1000]
+        parsed_bodies = self.agents.email_parse_chain.batch(
+            [{"email_content": email.body} for email in long_emails],
+            config=self.get_batch_configs(long_emails),
+            return_exceptions=True
+        )
+        for email, parsed_body in zip(long_emails, parsed_bodies):
+            # Keep the full body if parsing failed
+            if not isinstance(parsed_body, Exception):
+                email.body = parsed_body
         
     def parse_email_content(self, email_body):
         if len(email_body) > 1000:
@@ -91,7 +249,7 @@ class Nodes:
             category == "Not Interested"
         ):
             return "Write Directly"
-        elif (category == "Want to Publish" or category == "Share Another Paper"):
+        elif category in RAG_CATEGORIES:
             return "Need RAG"
         elif category == "Unrelated":
             return "Unrelated"
@@ -99,7 +257,11 @@ class Nodes:
     def extract_email_inquiries(self, state):
         print("Extracting inquiries from emails...\n")
         email_content = state["current_email"].body
-        inquiries = self.agents.inquiry_extraction_chain.invoke({"email_content": email_content})
+        if state["email_inquiries"] is not None:
+            # Already extracted by the combined triage call
+            inquiries = {"inquiries": list(state["email_inquiries"])}
+        else:
+            inquiries = self.agents.inquiry_extraction_chain.invoke({"email_content": email_content})
         if state["email_category"] == "Want to Publish":
             if 'Submission Process and Procedure' not in inquiries['inquiries']:
                 inquiries['inquiries'].extend(['Submission Process and Procedure'])
@@ -112,11 +274,10 @@ class Nodes:
 
     def retrieve_docs_from_rag(self, state):
         print("Retrieve docs from vector DB...\n")
-        retriever = self.agents.vectorstore.as_retriever(search_kwargs={"k": 2})
+        retrieved_docs, timings = self.agents.retriever.retrieve(state['email_inquiries'])
+        print(f"Retrieved {len(retrieved_docs)} docs (label index hits: {timings['label_index_hits']}, embedding: {timings['embedding_ms']}ms, search: {timings['search_ms']}ms)")
         
-        docs = []
-        for q in state['email_inquiries']:
-            docs += [extract_response(doc.page_content) for doc in retriever.invoke(q)]
+        docs = [extract_response(doc.page_content) for doc in retrieved_docs]
         documents = "\n\n////////////\n\n".join(docs)
         
         context = self.agents.docs_writer_chain.invoke({
@@ -151,16 +312,25 @@ class Nodes:
         else:
             generated_email = self.agents.write_email_chain.invoke({
                 "email_content": email_content,
-                "context": state["retrieved_context"]
-            })
-            
-            # Add latest information to email
-            update_information = compose_update_information(state, self.journal_prices)
-            generated_email = self.agents.update_email_info_chain.invoke({
-                "email_content": generated_email,
+                "context": state["retrieved_context"],
                 "recipient": state["current_email"].sender,
-                "information": update_information
+                # Simple emails are written by the flash model
+                "signals": {
+                    "inquiries": len(state["email_inquiries"]),
+                    "confidence": state["category_confidence"]
+                }
             })
+            
+            # Add latest information to email, in the slots written by the writer or with the LLM if any is missing
+            generated_email, slots_missing = fill_update_slots(generated_email, state, self.get_journal_prices())
+            DRAFT_INFO_UPDATES.labels("llm" if slots_missing else "slots").inc()
+            if slots_missing:
+                update_information = compose_update_information(state, self.get_journal_prices(), generated_email)
+                generated_email = self.agents.update_email_info_chain.invoke({
+                    "email_content": generated_email,
+                    "recipient": state["current_email"].sender,
+                    "information": update_information
+                })
         return {"generated_email": generated_email}
     
     # def need_to_review_email(self, state):
@@ -199,31 +369,50 @@ class Nodes:
 
     def create_draft_response(self, state):
         print("Creating draft response...\n")
-        current_inbox = EMAIL_INBOXES[self.current_inbox_index]
-        state["emails"].pop()
-        self.gmail_tools[current_inbox].create_draft_reply(
+        response = self.get_gmail_tools(state["inbox"]).create_draft_reply(
             state["current_email"].id,
             state["current_email"].threadId,
             state["current_email"].sender_email,
             state["current_email"].subject,
             state["generated_email"]
         )
-        return {"retrieved_context": "", "email_inquiries": [], "feedback": "", "trials": 0}
+        return self._record_email_outcome(state, OUTCOME_DRAFTED if response is not None else OUTCOME_FAILED)
     
     def send_email_response(self, state):
         print("Sending email...\n")
-        current_inbox = EMAIL_INBOXES[self.current_inbox_index]
-        state["emails"].pop()
-        self.gmail_tools[current_inbox].send_reply(
+        response = self.get_gmail_tools(state["inbox"]).send_reply(
             state["current_email"].id,
             state["current_email"].threadId,
             state["current_email"].sender_email,
             state["current_email"].subject,
             state["generated_email"]
         )
-        return {"retrieved_context": "", "email_inquiries": [], "feedback": "", "trials": 0}
+        return self._record_email_outcome(state, OUTCOME_SENT if response is not None else OUTCOME_FAILED)
     
     def skip_unrelated_email(self, state):
         print("Skipping unrelated email...\n")
-        state["emails"].pop()
-        return {"retrieved_context": "", "email_inquiries": [], "feedback": "", "trials": 0}
\ No newline at end of file
+        return self._record_email_outcome(state, OUTCOME_SKIPPED_UNRELATED)
+
+    def skip_failed_email(self, state, error):
+        print(f"An error occurred while processing email {state['current_email'].id}: {error}")
+        return self._record_email_outcome(state, OUTCOME_FAILED)
+
+    def _record_email_outcome(self, state, outcome):
+        self.ledger.record(state["inbox"], state["current_email"].id, state["current_email"].threadId, outcome)
+        EMAILS_PROCESSED.labels(state["inbox"], state["email_category"] or "Unknown", outcome).inc()
+        token_usage, chain_seconds = self.agents.token_usage.pop_email(state["current_email"].id)
+        tokens = sum(token_usage.values())
+        print(f"Tokens used for email {state['current_email'].id}: {tokens} {token_usage}")
+        # Cached triage outputs spend no LLM time
+        triage_seconds = sum(chain_seconds.get(chain, 0.0) for chain in TRIAGE_CHAINS)
+        if triage_seconds:
+            TRIAGE_LATENCY.labels(state["triage"]).observe(triage_seconds)
+        return {"results": [{
+            "id": state["current_email"].id,
+            "threadId": state["current_email"].threadId,
+            "category": state["email_category"],
+            "outcome": outcome,
+            "draft_created": outcome == OUTCOME_DRAFTED,
+            "tokens": tokens,
+            "triage": state["triage"]
+        }]}
@@ -82,6 +82,48 @@ The email you're analyzing is a reply to outreach email prompting the sender to
 "inquiries": ["Journal Indexing", "Submission Deadlines"]
 """
 
+TRIAGE_PROMPT = """
+You are an email triage assistant for a publishing company. 
+Your task is to review email replies received in response to our outreach campaigns, which encourage researchers 
+to consider publishing their papers in our journals, and in a single pass clean the email, detect its intent and 
+identify all inquiries from the sender.
+
+## Instructions:
+1. **Body**: {body_instruction}
+2. **Intent**: Determine the primary intent of the sender, one of:
+  - **Paper Already Published**: The requested paper has already been published in another journal.
+  - **Want to Publish**: The sender wants to submit the requested paper to our journal and/or asks about specific details regarding our journal (e.g., submission process, costs, deadlines, indexing).
+  - **Share Another Paper**: The sender wants to propose a different paper, asks for an initial review before considering submission, or has other queries related to our journal or our interest in his paper.
+  - **Not Interested**: The sender does not want to submit his paper to the journal for some reason.
+  - **Unrelated**: The email is completely unrelated to our invitation to submit a paper to the journal.
+3. **Inquiries**: Identify both explicit and implicit inquiries made by the sender, using these types:
+  - **Submission Process and Procedure**: The sender is interested in the submission process, is ready to submit the requested paper, or asks about the assessment process.
+  - **Journal Suggestions or Paper Proposal**: The sender proposes a different paper for submission or may request guidance on which journal would be suitable.
+  - **Fees or Charges**: The sender asks about any associated costs for submission or publication.
+  - **Submission Deadlines**: The sender inquires about the timeline for submission, mentions possible delays, or needs additional time to prepare the paper.
+  - **Journal Indexing**: The sender specifically asks about the indexing status of the journal.
+  - **Submission Guidelines (formatting, word count, or page count)**: The sender asks about requirements for formatting, word count, or page count.
+
+## Email Content:
+<email>
+{email_content}
+</email>
+
+## IMPORTANT:
+- Return a valid JSON object with the keys `"body"`, `"intent"` and `"inquiries"` (a list, possibly empty).
+- Use the intents and inquiry types exactly as they are listed above.
+- Mentions of dates, timelines, or delays often imply inquiries about deadlines.
+
+**Example Output**:
+{{"body": "", "intent": "Want to Publish", "inquiries": ["Fees or Charges", "Submission Deadlines"]}}
+"""
+
+TRIAGE_CLEAN_BODY = (
+    "Return in `body` only the main message present at the beginning of the email, without any previous email "
+    "thread, signature, unsubscribe links, disclaimers or standard warnings."
+)
+TRIAGE_KEEP_BODY = "Return an empty string in `body`, the email is already clean."
+
 DOCS_WRITER_PROMPT ="""
 You are an expert email analyst tasked with reviewing past email replies to extract relevant responses for the given inquiries. 
 
@@ -132,11 +174,15 @@ Your role involves crafting responses to the company's email outreach campaigns.
 ## Previous Emails Context:
 {context}
 
+## Recipient details:
+{recipient}
+
 ## IMPORTANT:
 - Do not explicitly reference the previous emails in your response, but follow their tone and structure exactly.
 - Do not add or include any new information beyond what is provided in the past emails.
-- Include the recipient name at the start or start with "Hello" if name in uknown and add the regards at the end.
+- Include the recipient first name at the start or start with "Hello" if name in uknown and add the regards at the end.
 - Use transition phrases to improve the flow of the email.
+- Costs and deadlines of the past emails are outdated, the latest ones are filled in afterwards: whenever the email mentions them, write [JOURNAL_PRICE] in place of the cost amount (with its currency) and [SUBMISSION_DEADLINE] in place of the deadline date.
 """
 
 # INFORMATION_UPDATER_PROMPT = """
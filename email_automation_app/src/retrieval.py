@@ -0,0 +1,155 @@
+import os, json, time, hashlib, threading
+from langchain_core.documents import Document
+from langchain_chroma import Chroma
+from langchain_google_genai import GoogleGenerativeAIEmbeddings
+from .utils import INQUIRY_LABELS
+from .vectorstores import NumpyVectorStore
+
+def get_indexed_ids(vectorstore):
+    if isinstance(vectorstore, Chroma):
+        return vectorstore.get(include=[])["ids"]
+    return vectorstore.get_ids()
+
+def vectorstore_fingerprint(vectorstore):
+    """
+    Fingerprint of the indexed chunks, it changes whenever the database is re-indexed.
+    """
+    ids = get_indexed_ids(vectorstore)
+    return hashlib.sha256("\n".join(sorted(ids)).encode()).hexdigest()
+
+class LabelIndex:
+    def __init__(self, path, labels=INQUIRY_LABELS):
+        """
+        Precomputed retrieval results of the fixed inquiry labels, saved next to the 
+        vector database and only valid for the database fingerprint it was built for.
+        """
+        self.path = path
+        self.labels = labels
+        self.documents = {}
+        self.loaded_mtime = None
+
+    def is_outdated(self):
+        # The index file is rewritten each time the database is re-indexed
+        mtime = os.path.getmtime(self.path) if os.path.exists(self.path) else None
+        return mtime is None or mtime != self.loaded_mtime
+
+    def load(self, fingerprint, k):
+        """
+        Load the index from disk, returns False if it is missing or built for another 
+        database or another number of documents per label.
+        """
+        self.documents = {}
+        if not os.path.exists(self.path):
+            return False
+        with open(self.path) as f:
+            index = json.load(f)
+        if index["fingerprint"] != fingerprint or index.get("k") != k:
+            print("Label index is outdated, it will be rebuilt")
+            return False
+        self.documents = {
+            label: [Document(page_content=doc["page_content"], metadata=doc["metadata"]) for doc in docs]
+            for label, docs in index["labels"].items()
+        }
+        self.loaded_mtime = os.path.getmtime(self.path)
+        return True
+
+    def build(self, retriever, fingerprint):
+        print(f"Building label index for {len(self.labels)} inquiry labels...")
+        results = retriever.search_by_vectors(retriever.embed_queries(self.labels))
+        index = {
+            "fingerprint": fingerprint,
+            "k": retriever.k,
+            "labels": {
+                label: [{"page_content": doc.page_content, "metadata": doc.metadata} for doc in docs]
+                for label, docs in zip(self.labels, results)
+            }
+        }
+        os.makedirs(os.path.dirname(self.path), exist_ok=True)
+        with open(self.path, "w") as f:
+            json.dump(index, f)
+        self.load(fingerprint, retriever.k)
+
+    def get(self, label):
+        return self.documents.get(label)
+
+class MultiQueryRetriever:
+    def __init__(self, vectorstore, embeddings, k=2, label_index=None):
+        """
+        Retrieve the documents of several queries at once: all queries are embedded in a 
+        single batched request and searched in a single vector store query.
+        Known inquiry labels are served from the precomputed `label_index` when given.
+        """
+        self.vectorstore = vectorstore
+        self.embeddings = embeddings
+        self.k = k
+        self.label_index = label_index
+        self.label_index_lock = threading.Lock()
+
+    def retrieve(self, queries):
+        """
+        Returns the unique documents retrieved for all queries, in query order, 
+        and the latency of each step in milliseconds.
+        """
+        if not queries:
+            return [], {"label_index_hits": 0, "embedding_ms": 0.0, "search_ms": 0.0}
+        
+        start = time.perf_counter()
+        results = [self.get_label_documents(query) for query in queries]
+        
+        # Free-form queries fall back to a live search
+        live_queries = [query for query, docs in zip(queries, results) if docs is None]
+        embedded = searched = time.perf_counter()
+        if live_queries:
+            query_vectors = self.embed_queries(live_queries)
+            embedded = time.perf_counter()
+            live_results = iter(self.search_by_vectors(query_vectors))
+            searched = time.perf_counter()
+            results = [docs if docs is not None else next(live_results) for docs in results]
+        
+        # The same chunk is often retrieved for several inquiries
+        documents, seen = [], set()
+        for docs in results:
+            for doc in docs:
+                if doc.page_content not in seen:
+                    seen.add(doc.page_content)
+                    documents.append(doc)
+        
+        timings = {
+            "label_index_hits": len(queries) - len(live_queries),
+            "embedding_ms": round((embedded - start) * 1000, 1),
+            "search_ms": round((searched - embedded) * 1000, 1)
+        }
+        return documents, timings
+
+    def get_label_documents(self, label):
+        if self.label_index is None or label not in self.label_index.labels:
+            return None
+        with self.label_index_lock:
+            if self.label_index.is_outdated():
+                fingerprint = vectorstore_fingerprint(self.vectorstore)
+                if not self.label_index.load(fingerprint, self.k):
+                    self.label_index.build(self, fingerprint)
+        return self.label_index.get(label)
+
+    def embed_queries(self, queries):
+        if isinstance(self.embeddings, GoogleGenerativeAIEmbeddings):
+            # Same task type as embed_query, but in one request for all queries
+            return self.embeddings.embed_documents(queries, task_type="RETRIEVAL_QUERY")
+        return self.embeddings.embed_documents(queries)
+
+    def search_by_vectors(self, query_vectors):
+        if isinstance(self.vectorstore, Chroma):
+            # Chroma can search all query vectors in one call
+            results = self.vectorstore._collection.query(
+                query_embeddings=query_vectors, 
+                n_results=self.k, 
+                include=["documents", "metadatas"]
+            )
+            return [
+                [Document(page_content=text, metadata=metadata or {}) for text, metadata in zip(texts, metadatas)]
+                for texts, metadatas in zip(results["documents"], results["metadatas"])
+            ]
+        if isinstance(self.vectorstore, NumpyVectorStore):
+            results = self.vectorstore.search_by_vectors(query_vectors, k=self.k)
+            return [[doc for doc, _ in docs] for docs in results]
+        return [self.vectorstore.similarity_search_by_vector(vector, k=self.k) for vector in query_vectors]
@@ -0,0 +1,143 @@
+import os, json, time, queue, threading
+from concurrent.futures import ThreadPoolExecutor
+from .state import create_initial_state
+from .store import OUTCOME_FAILED
+
+DEFAULT_EMAIL_INBOXES = ["editorials@nabpress.com", "journals@nabpress.com"]
+
+def load_email_inboxes():
+    """
+    Load the inboxes to process from the file given in EMAIL_INBOXES_FILE (a JSON list 
+    or one inbox per line), or from the comma separated EMAIL_INBOXES env variable.
+    """
+    inboxes_file = os.getenv("EMAIL_INBOXES_FILE")
+    if inboxes_file:
+        with open(inboxes_file) as f:
+            content = f.read()
+        if content.lstrip().startswith("["):
+            inboxes = json.loads(content)
+        else:
+            inboxes = [line for line in content.splitlines() if not line.strip().startswith("#")]
+    elif os.getenv("EMAIL_INBOXES"):
+        inboxes = os.getenv("EMAIL_INBOXES").split(",")
+    else:
+        inboxes = DEFAULT_EMAIL_INBOXES
+    
+    # Drop empty entries & duplicates while keeping the registry order
+    return list(dict.fromkeys(inbox.strip() for inbox in inboxes if inbox.strip()))
+
+class InboxScheduler:
+    def __init__(self, workflow, inboxes=None, max_concurrency=None, batch_size=None):
+        """
+        Run the workflow over many inboxes in parallel, at most `max_concurrency` at a time.
+        Emails of each inbox are streamed through the workflow in batches of `batch_size`.
+        """
+        self.workflow = workflow
+        self.inboxes = inboxes if inboxes is not None else load_email_inboxes()
+        self.max_concurrency = max_concurrency or int(os.getenv("MAX_CONCURRENT_INBOXES", 4))
+        self.batch_size = batch_size or int(os.getenv("EMAIL_BATCH_SIZE", 50))
+        # Emails of a batch are processed in parallel branches, at most `max_concurrency` at a time
+        self.config = {'max_concurrency': int(os.getenv("MAX_CONCURRENT_EMAILS", 8))}
+
+    def run(self):
+        print(f"Processing {len(self.inboxes)} inboxes ({self.max_concurrency} at a time)...\n")
+        start_time = time.perf_counter()
+        with ThreadPoolExecutor(max_workers=self.max_concurrency) as executor:
+            reports = list(executor.map(self.process_inbox, self.inboxes))
+        return self._summarize(reports, time.perf_counter() - start_time)
+
+    def stream(self):
+        """
+        Same as `run`, but yield compact progress events (node, email and inbox 
+        events, then a final done event with the run report) as they happen.
+        Closing the generator stops the inboxes after their current batch, without 
+        waiting for it: queued inboxes are cancelled.
+        """
+        print(f"Streaming {len(self.inboxes)} inboxes ({self.max_concurrency} at a time)...\n")
+        start_time = time.perf_counter()
+        events, stop = queue.Queue(), threading.Event()
+        executor = ThreadPoolExecutor(max_workers=self.max_concurrency)
+        futures = [executor.submit(self.process_inbox, inbox, events.put, stop) for inbox in self.inboxes]
+        try:
+            while True:
+                try:
+                    yield events.get(timeout=0.1)
+                except queue.Empty:
+                    if all(future.done() for future in futures) and events.empty():
+                        break
+        finally:
+            stop.set()
+            executor.shutdown(wait=False, cancel_futures=True)
+        
+        reports = [future.result() for future in futures]
+        yield {"event": "done", **self._summarize(reports, time.perf_counter() - start_time)}
+
+    def _summarize(self, reports, duration):
+        total_emails = sum(report["emails_processed"] for report in reports)
+        print(f"All inboxes processed: {total_emails} emails in {duration:.2f}s")
+        return {
+            "inboxes": reports,
+            "emails_processed": total_emails,
+            "duration": round(duration, 3),
+            "emails_per_second": round(total_emails / duration, 3) if duration else 0.0,
+            "local_classifier": self.workflow.nodes.local_classifier.get_stats(),
+            "llm_cache": self.workflow.nodes.agents.get_cache_stats(),
+            "llm_tokens": self.workflow.nodes.agents.get_token_stats(),
+            "model_tiers": self.workflow.nodes.agents.get_tier_stats()
+        }
+
+    def process_inbox(self, inbox, emit=None, stop=None):
+        print(f"\nProcessing inbox: {inbox}\n")
+        start_time = time.perf_counter()
+        emails_processed, emails_failed, error = 0, 0, None
+        try:
+            # The workflow is shared between runs, wait for any other run on this inbox to finish
+            with self.workflow.nodes.get_inbox_lock(inbox):
+                gmail_tools = self.workflow.nodes.get_gmail_tools(inbox)
+                batches = gmail_tools.iter_unreplied_threads(batch_size=self.batch_size)
+                while True:
+                    try:
+                        emails = next(batches)
+                    except StopIteration as done:
+                        history_id, fetch_failed = done.value
+                        emails_failed += fetch_failed
+                        # Only move the sync checkpoint once all batches were processed, failed 
+                        # emails (including the ones that could not be fetched) must be listed 
+                        # again to be retried
+                        if emails_failed:
+                            print(f"Keeping the sync checkpoint of {inbox}, {emails_failed} emails failed")
+                        else:
+                            gmail_tools.commit_sync_checkpoint(history_id)
+                        break
+                    
+                    state = create_initial_state(inbox, emails)
+                    if emit is None:
+                        outputs = self.workflow.app.invoke(state, self.config)
+                        emails_processed += len(outputs["results"])
+                        emails_failed += sum(result["outcome"] == OUTCOME_FAILED for result in outputs["results"])
+                    else:
+                        # Node & email events are emitted by the timed nodes on the custom stream
+                        for _, event in self.workflow.app.stream(state, self.config, stream_mode="custom", subgraphs=True):
+                            emit(event)
+                            if event["event"] == "email":
+                                emails_processed += 1
+                                emails_failed += event["outcome"] == OUTCOME_FAILED
+                    if stop is not None and stop.is_set():
+                        break
+        except Exception as e:
+            print(f"An error occurred while processing inbox {inbox}: {e}")
+            error = str(e)
+        duration = time.perf_counter() - start_time
+        
+        print(f"Inbox {inbox} done: {emails_processed} emails in {duration:.2f}s")
+        report = {
+            "inbox": inbox,
+            "emails_processed": emails_processed,
+            "emails_failed": emails_failed,
+            "duration": round(duration, 3),
+            "emails_per_second": round(emails_processed / duration, 3) if duration else 0.0,
+            "error": error
+        }
+        if emit is not None:
+            emit({"event": "inbox", **report})
+        return report
@@ -1,6 +1,7 @@
+import operator
 from pydantic import BaseModel, Field
-from typing import List
-from typing_extensions import TypedDict
+from typing import List, Dict, Optional, Literal
+from typing_extensions import TypedDict, Annotated
 
 class Email(BaseModel):
     id: str = Field(..., description="Unique identifier of the email")
@@ -10,12 +11,86 @@ class Email(BaseModel):
     subject: str = Field(..., description="Subject line of the email")
     body: str = Field(..., description="Body content of the email")
 
+class TriageResult(BaseModel):
+    body: str = Field("", description="Main message of the email, empty when it is already clean")
+    intent: Literal[
+        "Paper Already Published", "Want to Publish", "Share Another Paper", "Not Interested", "Unrelated"
+    ] = Field(..., description="Primary intent of the sender")
+    inquiries: List[Literal[
+        "Submission Process and Procedure",
+        "Journal Suggestions or Paper Proposal",
+        "Fees or Charges",
+        "Submission Deadlines",
+        "Journal Indexing",
+        "Submission Guidelines (formatting, word count, or page count)"
+    ]] = Field(default_factory=list, description="Inquiries of the sender")
+
+class EmailResult(TypedDict):
+    id: str
+    threadId: str
+    category: str
+    outcome: str
+    draft_created: bool
+    # Estimated LLM tokens spent on the email
+    tokens: int
+    # Triage path of the email, "combined" or "separate" LLM calls
+    triage: str
+
 class GraphState(TypedDict):
+    inbox: str
     emails: List[Email]
+    email_categories: Dict[str, str]
+    # Confidence of the local classifier, for emails categorized without the LLM
+    category_confidences: Dict[str, float]
+    # Inquiries of the emails triaged in a single call with their body & intent
+    triaged_inquiries: Dict[str, List[str]]
+    # Results of all processed emails, collected from the parallel email branches
+    results: Annotated[List[EmailResult], operator.add]
+
+class EmailState(TypedDict):
+    inbox: str
     current_email: Email
     email_category: str
-    email_inquiries: List[str]
+    category_confidence: Optional[float]
+    triage: str
+    # None until the inquiries are extracted
+    email_inquiries: Optional[List[str]]
     retrieved_context: str
     generated_email: str
     editor_feedback: str
-    trials: int
\ No newline at end of file
+    trials: int
+    results: Annotated[List[EmailResult], operator.add]
+
+class EmailOutputState(TypedDict):
+    results: Annotated[List[EmailResult], operator.add]
+
+def create_initial_state(inbox, emails=None):
+    """
+    Build a fresh graph state for processing a batch of emails from a single inbox.
+    """
+    return {
+        "inbox": inbox,
+        "emails": [Email(**email) for email in emails or []],
+        "email_categories": {},
+        "category_confidences": {},
+        "triaged_inquiries": {},
+        "results": []
+    }
+
+def create_email_state(inbox, email, email_category="", category_confidence=None, triage="separate", email_inquiries=None):
+    """
+    Build the state of the branch processing a single email.
+    """
+    return {
+        "inbox": inbox,
+        "current_email": email,
+        "email_category": email_category,
+        "category_confidence": category_confidence,
+        "triage": triage,
+        "email_inquiries": email_inquiries,
+        "retrieved_context": "",
+        "generated_email": "",
+        "editor_feedback": "",
+        "trials": 0,
+        "results": []
+    }
@@ -0,0 +1,204 @@
+import os, time, sqlite3, threading
+from .utils import STATE_DATABASE_PATH
+
+class SQLiteStore:
+    SCHEMA = ""
+
+    def __init__(self, db_path=STATE_DATABASE_PATH):
+        """
+        Small thread-safe wrapper around a local SQLite database used to persist 
+        state between workflow runs.
+        """
+        os.makedirs(os.path.dirname(db_path), exist_ok=True)
+        self.db_path = db_path
+        self.lock = threading.Lock()
+        self.conn = sqlite3.connect(db_path, timeout=30, check_same_thread=False)
+        self.conn.execute("PRAGMA journal_mode=WAL")
+        with self.lock, self.conn:
+            self.conn.executescript(self.SCHEMA)
+
+    def execute(self, query, params=()):
+        with self.lock, self.conn:
+            return self.conn.execute(query, params).fetchall()
+
+class SyncCheckpointStore(SQLiteStore):
+    SCHEMA = """
+    CREATE TABLE IF NOT EXISTS sync_checkpoints (
+        inbox TEXT PRIMARY KEY,
+        history_id TEXT NOT NULL,
+        updated_at REAL NOT NULL
+    );
+    """
+
+    def get_history_id(self, inbox):
+        rows = self.execute("SELECT history_id FROM sync_checkpoints WHERE inbox = ?", (inbox,))
+        return rows[0][0] if rows else None
+
+    def set_history_id(self, inbox, history_id):
+        self.execute(
+            "INSERT OR REPLACE INTO sync_checkpoints (inbox, history_id, updated_at) VALUES (?, ?, ?)",
+            (inbox, str(history_id), time.time())
+        )
+
+class DraftIndexStore(SQLiteStore):
+    SCHEMA = """
+    CREATE TABLE IF NOT EXISTS draft_index (
+        inbox TEXT NOT NULL,
+        draft_id TEXT NOT NULL,
+        thread_id TEXT NOT NULL,
+        message_id TEXT,
+        PRIMARY KEY (inbox, draft_id)
+    );
+    CREATE INDEX IF NOT EXISTS draft_index_threads ON draft_index (inbox, thread_id);
+    CREATE TABLE IF NOT EXISTS draft_index_reconciles (
+        inbox TEXT PRIMARY KEY,
+        reconciled_at REAL NOT NULL
+    );
+    """
+
+    def threads_with_drafts(self, inbox):
+        rows = self.execute("SELECT DISTINCT thread_id FROM draft_index WHERE inbox = ?", (inbox,))
+        return {row[0] for row in rows}
+
+    def add_draft(self, inbox, draft_id, thread_id, message_id=None):
+        self.execute(
+            "INSERT OR REPLACE INTO draft_index (inbox, draft_id, thread_id, message_id) VALUES (?, ?, ?, ?)",
+            (inbox, draft_id, thread_id, message_id)
+        )
+
+    def replace_drafts(self, inbox, drafts):
+        """
+        Replace the indexed drafts of an inbox with the given list and mark it as reconciled.
+        """
+        with self.lock, self.conn:
+            self.conn.execute("DELETE FROM draft_index WHERE inbox = ?", (inbox,))
+            self.conn.executemany(
+                "INSERT OR REPLACE INTO draft_index (inbox, draft_id, thread_id, message_id) VALUES (?, ?, ?, ?)",
+                [(inbox, draft['draft_id'], draft['threadId'], draft['id']) for draft in drafts]
+            )
+            self.conn.execute(
+                "INSERT OR REPLACE INTO draft_index_reconciles (inbox, reconciled_at) VALUES (?, ?)",
+                (inbox, time.time())
+            )
+
+    def last_reconciled_at(self, inbox):
+        rows = self.execute("SELECT reconciled_at FROM draft_index_reconciles WHERE inbox = ?", (inbox,))
+        return rows[0][0] if rows else None
+
+class LLMCacheStore(SQLiteStore):
+    SCHEMA = """
+    CREATE TABLE IF NOT EXISTS llm_cache (
+        key TEXT PRIMARY KEY,
+        chain TEXT NOT NULL,
+        value TEXT NOT NULL,
+        size INTEGER NOT NULL,
+        created_at REAL NOT NULL,
+        accessed_at REAL NOT NULL
+    );
+    CREATE INDEX IF NOT EXISTS llm_cache_accessed ON llm_cache (accessed_at);
+    """
+
+    def __init__(self, db_path=STATE_DATABASE_PATH, max_bytes=None):
+        super().__init__(db_path)
+        self.max_bytes = max_bytes or int(os.getenv("LLM_CACHE_MAX_BYTES", 100 * 1024 * 1024))
+
+    def get(self, key, ttl):
+        """
+        Returns the cached JSON value or None if missing or older than `ttl` seconds.
+        """
+        now = time.time()
+        with self.lock, self.conn:
+            row = self.conn.execute("SELECT value, created_at FROM llm_cache WHERE key = ?", (key,)).fetchone()
+            if row is None:
+                return None
+            if now - row[1] > ttl:
+                self.conn.execute("DELETE FROM llm_cache WHERE key = ?", (key,))
+                return None
+            self.conn.execute("UPDATE llm_cache SET accessed_at = ? WHERE key = ?", (now, key))
+            return row[0]
+
+    def set(self, key, chain, value):
+        now = time.time()
+        with self.lock, self.conn:
+            self.conn.execute(
+                "INSERT OR REPLACE INTO llm_cache (key, chain, value, size, created_at, accessed_at) VALUES (?, ?, ?, ?, ?, ?)",
+                (key, chain, value, len(value), now, now)
+            )
+            # Evict the least recently used entries beyond the size limit
+            self.conn.execute(
+                """
+                DELETE FROM llm_cache WHERE key IN (
+                    SELECT key FROM (
+                        SELECT key, SUM(size) OVER (ORDER BY accessed_at DESC, key) AS total_size FROM llm_cache
+                    ) WHERE total_size > ?
+                )
+                """,
+                (self.max_bytes,)
+            )
+
+# Outcomes of processed messages recorded in the ledger
+OUTCOME_DRAFTED = "drafted"
+OUTCOME_SENT = "sent"
+OUTCOME_SKIPPED_UNRELATED = "skipped-unrelated"
+OUTCOME_SKIPPED_OWN = "skipped-own"
+OUTCOME_BOUNCE = "bounce"
+OUTCOME_FAILED = "failed"
+
+class MessageLedgerStore(SQLiteStore):
+    SCHEMA = """
+    CREATE TABLE IF NOT EXISTS message_ledger (
+        inbox TEXT NOT NULL,
+        message_id TEXT NOT NULL,
+        thread_id TEXT,
+        outcome TEXT NOT NULL,
+        attempts INTEGER NOT NULL DEFAULT 1,
+        processed_at REAL NOT NULL,
+        PRIMARY KEY (inbox, message_id)
+    );
+    """
+
+    def __init__(self, db_path=STATE_DATABASE_PATH, max_failed_attempts=None):
+        super().__init__(db_path)
+        self.max_failed_attempts = max_failed_attempts or int(os.getenv("MAX_FAILED_ATTEMPTS", 3))
+
+    def record(self, inbox, message_id, thread_id, outcome):
+        self.record_many(inbox, [(message_id, thread_id)], outcome)
+
+    def record_many(self, inbox, messages, outcome):
+        """
+        Record the outcome of a list of (message id, thread id) pairs.
+        """
+        now = time.time()
+        with self.lock, self.conn:
+            self.conn.executemany(
+                """
+                INSERT INTO message_ledger (inbox, message_id, thread_id, outcome, attempts, processed_at) 
+                VALUES (?, ?, ?, ?, 1, ?)
+                ON CONFLICT (inbox, message_id) DO UPDATE SET 
+                    outcome = excluded.outcome, 
+                    attempts = attempts + 1, 
+                    processed_at = excluded.processed_at
+                """,
+                [(inbox, message_id, thread_id, outcome, now) for message_id, thread_id in messages]
+            )
+
+    def processed_ids(self, inbox, message_ids):
+        """
+        Returns the given message ids that must not be processed again: failed messages 
+        are retried until they reach `max_failed_attempts`.
+        """
+        processed = set()
+        message_ids = list(message_ids)
+        # Stay under the SQLite limit of query parameters
+        for i in range(0, len(message_ids), 500):
+            chunk = message_ids[i:i + 500]
+            rows = self.execute(
+                f"""
+                SELECT message_id FROM message_ledger 
+                WHERE inbox = ? AND message_id IN ({", ".join("?" * len(chunk))})
+                AND (outcome != ? OR attempts >= ?)
+                """,
+                (inbox, *chunk, OUTCOME_FAILED, self.max_failed_attempts)
+            )
+            processed.update(row[0] for row in rows)
+        return processed
@@ -0,0 +1,135 @@
+import os, re, time, threading
+from collections import defaultdict
+from langchain_core.runnables import Runnable, ensure_config
+from .budget import CLOSING_PATTERN
+from .utils import UPDATE_SLOT_PATTERN
+from .metrics import MODEL_TIER_CALLS, MODEL_TIER_LATENCY, MODEL_TIER_LATENCY_SAVED
+
+TIER_FLASH, TIER_PRO, TIER_ESCALATED = "flash", "pro", "escalated"
+
+# Unfilled template slots and prompt sections leaking into the draft
+PLACEHOLDER_PATTERN = re.compile(r"\[[^\]\n]{1,40}\]|\{\{?\s*\w+\s*\}?\}|<[A-Z_ ]{3,}>|^#+ ", re.MULTILINE)
+GREETING_PATTERN = re.compile(r"^(?:Dear|Hello|Hi|Hey|Good (?:morning|afternoon|evening)|Greetings)\b|^[^\n]{1,60},\s*$", re.IGNORECASE)
+
+class ModelRouter:
+    def __init__(self):
+        """
+        Pick the flash or pro model of a draft chain for each email, from cheap signals:
+        email length, number of inquiries and local classifier confidence. Emails 
+        classified by the LLM (confidence None) are routed on length & inquiries only, 
+        local predictions must also be well above LOCAL_CLASSIFIER_THRESHOLD to go to 
+        flash. Flash drafts failing validation are escalated to pro.
+        Thresholds are set with TIER_* env variables.
+        """
+        self.enabled = os.getenv("MODEL_TIERING_ENABLED", "true") == "true"
+        self.max_email_chars = int(os.getenv("TIER_FLASH_MAX_EMAIL_CHARS", 1500))
+        self.max_inquiries = int(os.getenv("TIER_FLASH_MAX_INQUIRIES", 3))
+        self.min_confidence = float(os.getenv("TIER_FLASH_MIN_CONFIDENCE", 0.97))
+        self.min_draft_chars = int(os.getenv("TIER_MIN_DRAFT_CHARS", 80))
+        self.lock = threading.Lock()
+        self.stats = defaultdict(lambda: defaultdict(float))
+
+    def select(self, email_chars, inquiries=0, confidence=None):
+        """
+        Returns the tier and the reason of the choice.
+        """
+        if not self.enabled:
+            return TIER_PRO, "disabled"
+        if email_chars > self.max_email_chars:
+            return TIER_PRO, "long_email"
+        if inquiries > self.max_inquiries:
+            return TIER_PRO, "many_inquiries"
+        if confidence is not None and confidence < self.min_confidence:
+            return TIER_PRO, "low_confidence"
+        return TIER_FLASH, "simple_email"
+
+    def validate(self, draft):
+        """
+        Cheap checks of a flash draft, returns the reason to escalate it or None.
+        """
+        draft = (draft or "").strip()
+        if len(draft) < self.min_draft_chars:
+            return "too_short"
+        # Cost & deadline slots are filled after the draft is written
+        if PLACEHOLDER_PATTERN.search(UPDATE_SLOT_PATTERN.sub("", draft)):
+            return "placeholder"
+        lines = [line.strip() for line in draft.split("\n") if line.strip()]
+        if not GREETING_PATTERN.match(lines[0]):
+            return "no_greeting"
+        if not any(CLOSING_PATTERN.match(line) for line in lines[-4:]):
+            return "no_closing"
+        return None
+
+    def record(self, chain, tier, reason, duration, flash_duration=0.0):
+        MODEL_TIER_CALLS.labels(chain, tier, reason).inc()
+        MODEL_TIER_LATENCY.labels(chain, TIER_FLASH if tier == TIER_FLASH else TIER_PRO).observe(duration)
+        with self.lock:
+            stats = self.stats[chain]
+            stats[tier] += 1
+            if tier == TIER_FLASH:
+                stats["flash_seconds"] += duration
+                stats["flash_calls"] += 1
+            else:
+                stats["pro_seconds"] += duration
+                stats["pro_calls"] += 1
+            # Estimated against the mean pro latency observed so far, escalations cost their flash call
+            saved = 0.0
+            if tier == TIER_FLASH and stats["pro_calls"]:
+                saved = stats["pro_seconds"] / stats["pro_calls"] - duration
+            elif tier == TIER_ESCALATED:
+                saved = -flash_duration
+            stats["latency_saved_seconds"] += saved
+        MODEL_TIER_LATENCY_SAVED.labels(chain).inc(saved)
+
+    def get_stats(self):
+        with self.lock:
+            return {
+                chain: {
+                    TIER_FLASH: int(stats[TIER_FLASH]),
+                    TIER_PRO: int(stats[TIER_PRO]),
+                    TIER_ESCALATED: int(stats[TIER_ESCALATED]),
+                    "latency_saved_seconds": round(stats["latency_saved_seconds"], 3)
+                }
+                for chain, stats in self.stats.items()
+            }
+
+class TieredChain(Runnable):
+    def __init__(self, flash_chain, pro_chain, name, router, email_field):
+        """
+        Run a draft chain on the flash model when the router allows it, and escalate
+        to the pro model when the flash draft fails validation. Routing signals are
+        passed in the optional "signals" input key ({"inquiries", "confidence"}),
+        the email length is read from `email_field`.
+        """
+        self.flash_chain = flash_chain
+        self.pro_chain = pro_chain
+        self.name = name
+        self.router = router
+        self.email_field = email_field
+
+    def invoke(self, input, config=None, **kwargs):
+        config = ensure_config(config)
+        input = dict(input)
+        signals = input.pop("signals", None) or {}
+        tier, reason = self.router.select(len(input[self.email_field]), **signals)
+
+        flash_duration = 0.0
+        if tier == TIER_FLASH:
+            start = time.perf_counter()
+            try:
+                draft = self.flash_chain.invoke(input, config, **kwargs)
+                reason = self.router.validate(draft)
+            except Exception as error:
+                print(f"An error occurred while writing the {self.name} draft with flash: {error}")
+                reason = "flash_error"
+            flash_duration = time.perf_counter() - start
+            if reason is None:
+                self.router.record(self.name, TIER_FLASH, "simple_email", flash_duration)
+                return draft
+            print(f"Escalating {self.name} draft to pro ({reason})")
+            tier = TIER_ESCALATED
+
+        start = time.perf_counter()
+        draft = self.pro_chain.invoke(input, config, **kwargs)
+        self.router.record(self.name, tier, reason, time.perf_counter() - start, flash_duration)
+        return draft
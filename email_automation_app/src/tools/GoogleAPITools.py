@@ -1,19 +1,50 @@
 import os
 import re
+import time
 import json
 import base64
+import httplib2
+import threading
 from google.oauth2 import service_account
+from google_auth_httplib2 import AuthorizedHttp
 from googleapiclient.discovery import build
+from googleapiclient.http import BatchHttpRequest
+from googleapiclient.errors import HttpError
 from email.mime.text import MIMEText
 from datetime import datetime, timedelta
+from itertools import islice
 from collections import defaultdict
-from src.utils import strip_old_replies, strip_old_replies_1
+from src.utils import strip_old_replies
+from src.store import SyncCheckpointStore, DraftIndexStore, MessageLedgerStore, OUTCOME_BOUNCE, OUTCOME_FAILED
+from src.metrics import GOOGLE_API_CALLS, GOOGLE_API_ERRORS
+
+GMAIL_BATCH_URI = "https://gmail.googleapis.com/batch/gmail/v1"
+# Gmail throttles batches larger than 50 requests
+GMAIL_BATCH_SIZE = 50
+# Batched gets failing with a rate limit or server error are retried with exponential backoff
+GMAIL_BATCH_RETRIES = int(os.getenv("GMAIL_BATCH_RETRIES", 3))
+GMAIL_BATCH_RETRY_DELAY = float(os.getenv("GMAIL_BATCH_RETRY_DELAY", 1.0))
+# How often the local draft index is reconciled with the drafts stored in Gmail
+DRAFT_INDEX_RECONCILE_SECONDS = int(os.getenv("DRAFT_INDEX_RECONCILE_SECONDS", 3600))
 
 
 class GmailToolsClass:
-    def __init__(self, inbox_email):
+    def __init__(
+        self, inbox_email, service=None, batch_uri=GMAIL_BATCH_URI, 
+        sync_mode=None, checkpoints=None, draft_index=None, ledger=None
+    ):
         self.inbox_email = inbox_email
-        self.service = self._get_gmail_service()
+        self.credentials = None
+        self.service = service or self._get_gmail_service()
+        self._local = threading.local()
+        self.batch_uri = batch_uri
+        self.draft_index = draft_index or DraftIndexStore()
+        self.ledger = ledger or MessageLedgerStore()
+        
+        # "window" lists the last 4 hours of emails, "incremental" only what changed since last run
+        self.sync_mode = sync_mode or os.getenv("GMAIL_SYNC_MODE", "window")
+        if self.sync_mode == "incremental":
+            self.checkpoints = checkpoints or SyncCheckpointStore()
 
     def _get_gmail_service(self):
         try:
@@ -27,32 +58,121 @@ class GmailToolsClass:
             )
             
             # Delegate credentials to specific user's inbox
-            delegated_credentials = credentials.with_subject(self.inbox_email)
+            self.credentials = credentials.with_subject(self.inbox_email)
             
-            return build('gmail', 'v1', credentials=delegated_credentials)
+            return build('gmail', 'v1', credentials=self.credentials)
         except Exception as error:
             print(f"Error creating Gmail service: {error}")
             raise
 
+    def _execute(self, request):
+        """
+        Execute an API request on the HTTP connection of the current thread, 
+        httplib2 connections can't be shared between threads.
+        """
+        if not hasattr(self._local, "http"):
+            http = httplib2.Http()
+            self._local.http = AuthorizedHttp(self.credentials, http=http) if self.credentials else http
+        
+        method = getattr(request, "methodId", None) or "gmail.batch"
+        GOOGLE_API_CALLS.labels("gmail", self.inbox_email, method).inc()
+        try:
+            return request.execute(http=self._local.http)
+        except Exception:
+            GOOGLE_API_ERRORS.labels("gmail", self.inbox_email, method).inc()
+            raise
+
     def fetch_recent_emails(self, max_results=100):
         try:
-            now = datetime.now()
-            four_hours_ago = now - timedelta(hours=4)
-
-            # Format for Gmail query
-            after_timestamp = int(four_hours_ago.timestamp())
-            before_timestamp = int(now.timestamp())
-
-            # Query to get emails from the last 4 hours
-            query = f'after:{after_timestamp} before:{before_timestamp}'
-            results = self.service.users().messages().list(userId=self.inbox_email, q=query, maxResults=max_results).execute()
-            messages = results.get('messages', [])
-            return messages
+            return list(islice(self.iter_recent_emails(page_size=min(max_results, 500)), max_results))
         
         except Exception as error:
             print(f"An error occurred while fetching emails: {error}")
             return []
 
+    def iter_recent_emails(self, page_size=100):
+        """
+        Lazily yields recent emails (id & threadId only), newest first, walking all result pages.
+        """
+        if self.sync_mode == "incremental":
+            return self.iter_emails_since_checkpoint(page_size)
+        return self.iter_emails_in_window(page_size)
+
+    def iter_emails_in_window(self, page_size=100):
+        now = datetime.now()
+        four_hours_ago = now - timedelta(hours=4)
+
+        # Format for Gmail query
+        after_timestamp = int(four_hours_ago.timestamp())
+        before_timestamp = int(now.timestamp())
+
+        # Query to get emails from the last 4 hours
+        query = f'after:{after_timestamp} before:{before_timestamp}'
+        page_token = None
+        while True:
+            results = self._execute(self.service.users().messages().list(
+                userId=self.inbox_email, q=query, maxResults=page_size, pageToken=page_token
+            ))
+            yield from results.get('messages', [])
+            page_token = results.get('nextPageToken')
+            if not page_token:
+                break
+
+    def iter_emails_since_checkpoint(self, page_size=100):
+        """
+        Yields the emails added to the inbox since the last stored history ID, 
+        falls back to a full resync when there is no checkpoint or it has expired.
+        Returns the new history ID, the caller commits it with `commit_sync_checkpoint`
+        once all emails have been processed.
+        """
+        start_history_id = self.checkpoints.get_history_id(self.inbox_email)
+        if start_history_id is None:
+            return (yield from self._iter_resync_emails(page_size))
+        
+        messages = []
+        history_id, page_token = start_history_id, None
+        try:
+            while True:
+                results = self._execute(self.service.users().history().list(
+                    userId=self.inbox_email, 
+                    startHistoryId=start_history_id,
+                    historyTypes=['messageAdded'],
+                    labelId='INBOX',
+                    maxResults=page_size,
+                    pageToken=page_token
+                ))
+                for record in results.get('history', []):
+                    for added in record.get('messagesAdded', []):
+                        messages.append({'id': added['message']['id'], 'threadId': added['message']['threadId']})
+                history_id = results.get('historyId', history_id)
+                page_token = results.get('nextPageToken')
+                if not page_token:
+                    break
+        except HttpError as error:
+            # Gmail returns 404 once the start history ID is too old
+            if error.resp.status == 404:
+                print(f"History checkpoint expired for {self.inbox_email}, running a full resync")
+                return (yield from self._iter_resync_emails(page_size))
+            raise
+        
+        # History is returned oldest first, keep the newest first order of messages.list
+        yield from reversed(messages)
+        return history_id
+
+    def _iter_resync_emails(self, page_size):
+        # Read the history ID before listing so no email is missed between both calls
+        profile = self._execute(self.service.users().getProfile(userId=self.inbox_email))
+        yield from self.iter_emails_in_window(page_size)
+        return profile['historyId']
+
+    def commit_sync_checkpoint(self, history_id):
+        """
+        Move the incremental sync checkpoint forward, to the history ID returned by 
+        `iter_unreplied_threads` once all its batches have been processed.
+        """
+        if self.sync_mode == "incremental" and history_id is not None:
+            self.checkpoints.set_history_id(self.inbox_email, history_id)
+
     def fetch_email_threads(self, email_list):
         thread_dict = defaultdict(lambda: {'sender': set(), 'subject': '', 'ids': [], 'body': []})
         
@@ -95,59 +215,115 @@ class GmailToolsClass:
         Fetches all draft email replies from Gmail.
         """
         try:
-            drafts = self.service.users().drafts().list(userId=self.inbox_email).execute()
-            draft_list = drafts.get('drafts', [])
-            return [
+            return self._list_all_drafts()
+        
+        except Exception as error:
+            print(f"An error occurred while fetching drafts: {error}")
+            return []
+
+    def _list_all_drafts(self):
+        drafts, page_token = [], None
+        while True:
+            results = self._execute(self.service.users().drafts().list(
+                userId=self.inbox_email, maxResults=500, pageToken=page_token
+            ))
+            drafts += [
                 {
                     'draft_id': draft['id'], 
                     'threadId': draft['message']['threadId'], 
                     'id': draft['message']['id']
-                } for draft in draft_list
+                } for draft in results.get('drafts', [])
             ]
-        
+            page_token = results.get('nextPageToken')
+            if not page_token:
+                return drafts
+
+    def get_threads_with_drafts(self):
+        """
+        Returns the threads having a draft reply from the local draft index, 
+        the index is reconciled with Gmail when it gets older than DRAFT_INDEX_RECONCILE_SECONDS.
+        """
+        last_reconciled_at = self.draft_index.last_reconciled_at(self.inbox_email)
+        if last_reconciled_at is None or time.time() - last_reconciled_at > DRAFT_INDEX_RECONCILE_SECONDS:
+            self.reconcile_draft_index()
+        return self.draft_index.threads_with_drafts(self.inbox_email)
+
+    def reconcile_draft_index(self):
+        try:
+            drafts = self._list_all_drafts()
+            self.draft_index.replace_drafts(self.inbox_email, drafts)
         except Exception as error:
-            print(f"An error occurred while fetching drafts: {error}")
-            return []
+            # Keep using the current index, it will be reconciled on the next run
+            print(f"An error occurred while reconciling draft index: {error}")
         
     def fetch_unreplied_threads(self, max_results=50):
         """
         Fetches recent email threads that don't have draft replies.
         """
         try:
-            recent_emails = self.fetch_recent_emails(max_results)
-            if not recent_emails:
-                return []
-            
-            latest_emails_in_threads = self._deduplicate_emails(recent_emails)
-            drafts = self.fetch_draft_replies()
-            threads_with_drafts = {draft['threadId'] for draft in drafts}
-            
             unreplied_emails = []
-            for email in latest_emails_in_threads:
-                if email['threadId'] not in threads_with_drafts:
-                    email_info = self._get_email_info(email['id'])
-                    if self.skip_returned_emails(email_info['sender']):
-                        continue
-                    unreplied_emails.append({
-                        'id': email['id'],
-                        'threadId': email['threadId'],
-                        'sender': email_info['sender'],
-                        'sender_email': email_info['sender_email'],
-                        'subject': email_info['subject'],
-                        'body': email_info['body']
-                    })
-            
-            return unreplied_emails
+            for emails in self.iter_unreplied_threads(batch_size=max_results):
+                unreplied_emails += emails
+                if len(unreplied_emails) >= max_results:
+                    break
+            return unreplied_emails[:max_results]
             
         except Exception as error:
             print(f"An error occurred while fetching unreplied threads: {error}")
             return []
 
+    def iter_unreplied_threads(self, batch_size=GMAIL_BATCH_SIZE):
+        """
+        Lazily yields batches of at most `batch_size` hydrated emails from recent threads 
+        that don't have draft replies, keeping only the latest email of each thread.
+        Returns the new history ID in incremental sync mode (None otherwise), to commit 
+        once the yielded emails have been processed, and the number of emails that could 
+        not be fetched.
+        """
+        threads_with_drafts = self.get_threads_with_drafts()
+        seen_threads = set()
+        unchecked_emails, pending_emails = [], []
+        fetch_failed = 0
+        recent_emails = self.iter_recent_emails()
+        while True:
+            try:
+                email = next(recent_emails)
+            except StopIteration as done:
+                history_id = done.value
+                break
+            if email['threadId'] in seen_threads:
+                continue
+            seen_threads.add(email['threadId'])
+            if email['threadId'] in threads_with_drafts:
+                continue
+            
+            unchecked_emails.append(email)
+            if len(unchecked_emails) >= batch_size:
+                pending_emails += self._skip_processed_emails(unchecked_emails)
+                unchecked_emails = []
+                while len(pending_emails) >= batch_size:
+                    emails, failed_emails = self._hydrate_emails(pending_emails[:batch_size])
+                    fetch_failed += len(failed_emails)
+                    yield emails
+                    pending_emails = pending_emails[batch_size:]
+        
+        pending_emails += self._skip_processed_emails(unchecked_emails)
+        for i in range(0, len(pending_emails), batch_size):
+            emails, failed_emails = self._hydrate_emails(pending_emails[i:i + batch_size])
+            fetch_failed += len(failed_emails)
+            yield emails
+        return history_id, fetch_failed
+
+    def _skip_processed_emails(self, emails):
+        # Emails already in the ledger are never hydrated nor classified again
+        processed_ids = self.ledger.processed_ids(self.inbox_email, [email['id'] for email in emails])
+        return [email for email in emails if email['id'] not in processed_ids]
+
     def create_draft_reply(self, id, threadId, sender, subject, reply_text):
         try:
             message = self._create_reply_message(sender, subject, reply_text, id)
             
-            draft = self.service.users().drafts().create(
+            draft = self._execute(self.service.users().drafts().create(
                 userId=self.inbox_email,
                 body={
                     'message': {
@@ -155,7 +331,8 @@ class GmailToolsClass:
                         'threadId': threadId
                     }
                 }
-            ).execute()
+            ))
+            self.draft_index.add_draft(self.inbox_email, draft['id'], threadId, draft['message']['id'])
             return draft
         except Exception as error:
             print(f"An error occurred while creating draft: {error}")
@@ -164,28 +341,29 @@ class GmailToolsClass:
     def send_reply(self, id, threadId, sender, subject, reply_text):
         try:
             message = self._create_reply_message(sender, subject, reply_text, id)
-            sent_message = self.service.users().messages().send(
+            sent_message = self._execute(self.service.users().messages().send(
                 userId=self.inbox_email, 
                 body={
                     'raw': self._encode_message(message),
                     'threadId': threadId
                 }
-            ).execute()
+            ))
             return sent_message
         except Exception as error:
             print(f"An error occurred while sending reply: {error}")
             return None
 
     def _get_email_info(self, msg_id):
-        msg = self.service.users().messages().get(userId=self.inbox_email, id=msg_id, format='full').execute()
+        msg = self._execute(self.service.users().messages().get(userId=self.inbox_email, id=msg_id, format='full'))
+        return self._parse_email_message(msg)
+
+    def _parse_email_message(self, msg):
         headers = msg['payload']['headers']
-        sender = next((header['value'] for header in headers if header['name'].lower() == 'from'), 'Unknown')
-        sender_email = re.search(r'<(.*?)>', sender).group(1) if re.search(r'<(.*?)>', sender) else sender
-        subject = next((header['value'] for header in headers if header['name'].lower() == 'subject'), 'No Subject')
+        sender, sender_email, subject = self._parse_email_headers(headers)
         body = self._get_email_body(msg)
         body = self._clean_body_text(body)
         return {
-            'id': msg_id,
+            'id': msg['id'],
             'threadId': msg["threadId"],
             'sender': sender,
             'sender_email': sender_email,
@@ -193,6 +371,79 @@ class GmailToolsClass:
             'body': body
         }
 
+    def _parse_email_headers(self, headers):
+        sender = next((header['value'] for header in headers if header['name'].lower() == 'from'), 'Unknown')
+        sender_email = re.search(r'<(.*?)>', sender).group(1) if re.search(r'<(.*?)>', sender) else sender
+        subject = next((header['value'] for header in headers if header['name'].lower() == 'subject'), 'No Subject')
+        return sender, sender_email, subject
+
+    def _hydrate_emails(self, emails):
+        """
+        Fetch the content of the given emails using batched requests: headers are fetched 
+        first to filter out returned emails, full bodies only for the remaining ones.
+        Returns the hydrated emails and the emails that could not be fetched, recorded 
+        as failed in the ledger so they are retried on the next runs.
+        """
+        msg_ids = [email['id'] for email in emails]
+        metadata, failed_ids = self._batch_get_messages(msg_ids, format='metadata', metadataHeaders=['From', 'Subject'])
+        
+        kept_ids, returned_emails = [], []
+        for msg_id in msg_ids:
+            if msg_id not in metadata:
+                continue
+            sender, _, _ = self._parse_email_headers(metadata[msg_id]['payload'].get('headers', []))
+            if self.skip_returned_emails(sender):
+                returned_emails.append((msg_id, metadata[msg_id]['threadId']))
+                continue
+            kept_ids.append(msg_id)
+        self.ledger.record_many(self.inbox_email, returned_emails, OUTCOME_BOUNCE)
+        
+        messages, full_failed_ids = self._batch_get_messages(kept_ids, format='full')
+        failed_ids = set(failed_ids) | set(full_failed_ids)
+        failed_emails = [(email['id'], email['threadId']) for email in emails if email['id'] in failed_ids]
+        self.ledger.record_many(self.inbox_email, failed_emails, OUTCOME_FAILED)
+        hydrated = [self._parse_email_message(messages[msg_id]) for msg_id in kept_ids if msg_id in messages]
+        return hydrated, failed_emails
+
+    def _batch_get_messages(self, msg_ids, **params):
+        """
+        Fetch messages through Gmail batch HTTP requests, retrying the sub-requests that
+        hit a rate limit or a server error. Returns a dict of messages by id and the ids 
+        that could not be fetched, deleted messages (404) are neither.
+        """
+        messages, retry_ids, failed_ids = {}, [], []
+        
+        def on_response(request_id, response, exception):
+            if exception is None:
+                messages[request_id] = response
+                return
+            print(f"An error occurred while fetching email {request_id}: {exception}")
+            GOOGLE_API_ERRORS.labels("gmail", self.inbox_email, "gmail.users.messages.get").inc()
+            status = exception.resp.status if isinstance(exception, HttpError) else None
+            if status == 429 or (status or 0) >= 500 or (status == 403 and b"RateLimitExceeded" in exception.content):
+                retry_ids.append(request_id)
+            elif status != 404:
+                failed_ids.append(request_id)
+        
+        for attempt in range(GMAIL_BATCH_RETRIES + 1):
+            if attempt:
+                if not retry_ids:
+                    break
+                msg_ids, retry_ids = retry_ids, []
+                time.sleep(GMAIL_BATCH_RETRY_DELAY * 2 ** (attempt - 1))
+                print(f"Retrying {len(msg_ids)} email fetches of {self.inbox_email} (attempt {attempt + 1})")
+            for i in range(0, len(msg_ids), GMAIL_BATCH_SIZE):
+                batch = BatchHttpRequest(callback=on_response, batch_uri=self.batch_uri)
+                for msg_id in msg_ids[i:i + GMAIL_BATCH_SIZE]:
+                    # Sub-requests are counted with their errors, the batch HTTP call under gmail.batch
+                    GOOGLE_API_CALLS.labels("gmail", self.inbox_email, "gmail.users.messages.get").inc()
+                    batch.add(
+                        self.service.users().messages().get(userId=self.inbox_email, id=msg_id, **params),
+                        request_id=msg_id
+                    )
+                self._execute(batch)
+        return messages, failed_ids + retry_ids
+
     def _get_email_body(self, msg):
         if 'parts' in msg['payload']:
             for part in msg['payload']['parts']:
@@ -203,9 +454,7 @@ class GmailToolsClass:
         return ''
     
     def _clean_body_text(self, text):
-        cleaned_text = strip_old_replies(text)
-        cleaned_text = strip_old_replies_1(cleaned_text)
-        return cleaned_text
+        return strip_old_replies(text)
     
     def skip_returned_emails(self, sender):
         return sender.lower().find("postmaster@") != -1 or sender.lower().find("mailer-daemon@googlemail.com") != -1
@@ -221,14 +470,6 @@ class GmailToolsClass:
 
     def _encode_message(self, message):
         return base64.urlsafe_b64encode(message.as_bytes()).decode()
-    
-    def _deduplicate_emails(self, emails):
-        thread_map = {}
-        for email in emails:
-            thread_id = email['threadId']
-            if thread_id not in thread_map:
-                thread_map[thread_id] = email
-        return list(thread_map.values())
 
 class GoogleSheetsToolsClass:
     def __init__(self, sheet_id, range_name):
@@ -263,6 +504,8 @@ class GoogleSheetsToolsClass:
         """
         Fetch data from Google Sheet and convert to dictionary format.
         """
+        # Journal prices are shared by all inboxes
+        GOOGLE_API_CALLS.labels("sheets", "all", "sheets.spreadsheets.values.get").inc()
         try:
             result = self.service.spreadsheets().values().get(
                 spreadsheetId=self.sheet_id,
@@ -278,4 +521,5 @@ class GoogleSheetsToolsClass:
 
         except Exception as error:
             print(f"An error occurred while fetching sheet data: {error}")
+            GOOGLE_API_ERRORS.labels("sheets", "all", "sheets.spreadsheets.values.get").inc()
             return {}
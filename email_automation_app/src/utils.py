@@ -1,8 +1,33 @@
 import re, os
 from datetime import datetime
-from mailparser_reply import EmailReplyParser
 
 RAG_DATABASE_DIR = f"{os.getcwd()}/email_automation_app/database"
+LABEL_INDEX_FILE = "label_index.json"
+INTENT_CLASSIFIER_PATH = os.getenv(
+    "INTENT_CLASSIFIER_PATH",
+    f"{os.getcwd()}/email_automation_app/models/intent_classifier.json"
+)
+STATE_DATABASE_PATH = os.getenv(
+    "STATE_DATABASE_PATH", 
+    f"{os.getcwd()}/email_automation_app/state/automation_state.sqlite3"
+)
+
+# Inquiry labels returned by the inquiry extraction chain or added in `extract_email_inquiries`
+INQUIRY_LABELS = [
+    "Submission Process and Procedure",
+    "Journal Suggestions or Paper Proposal",
+    "Fees or Charges",
+    "Submission Deadlines",
+    "Journal Indexing",
+    "Submission Guidelines (formatting, word count, or page count)",
+    "Want to share a draft",
+]
+
+# Slots written by the RAG email writer in place of the latest cost & deadline, filled locally
+JOURNAL_PRICE_SLOT = "[JOURNAL_PRICE]"
+SUBMISSION_DEADLINE_SLOT = "[SUBMISSION_DEADLINE]"
+UPDATE_SLOTS = {"Fees or Charges": JOURNAL_PRICE_SLOT, "Submission Deadlines": SUBMISSION_DEADLINE_SLOT}
+UPDATE_SLOT_PATTERN = re.compile(r"\[(?:JOURNAL_PRICE|SUBMISSION_DEADLINE)\]")
 
 STANDARD_REPLIES_TEMPLATES = {
     "Paper Already Published": """
@@ -27,38 +52,74 @@ Elena
 """,
 }
 
-def strip_old_replies(body):
-    languages = ['en', 'de', 'fr', 'it']
-    latest_reply = EmailReplyParser(languages=languages).parse_reply(text=body)
-    return latest_reply
-
-def strip_old_replies_1(body):
-    # Look for typical reply separators, starting from phrases like "On [date], [person] wrote:"
-    reply_pattern = re.compile(
-        r"(On\s.*?wrote:|Le\s.*?écrit :|From:\s.*?$|Sent:\s.*?$|Envoyé:\s.*?$|" +
-        r"Am\s.*?schrieb:|El\s.*?escribió:|Il\s.*?ha scritto:|在\s.*?写道:|" +
-        r"Em\s.*?escreveu:|Op\s.*?schreef:|日時：.*?差出人：|Pada\s.*?menulis:|" +
-        r"Dne\s.*?napsal:|W dniu\s.*?napisał:|Написано\s.*?:|Na\s.*?napisal:|" +
-        r"Tarihinde\s.*?yazdı:|Enviado\s.*?:|Op\s.*?skrev:|" +
-        r"På\s.*?skrev:|Den\s.*?skrev:|Enviado\s.*?por:|على\s.*?كتب:|" +
-        r"من\s.*?كتب:|Pošiljatelj\s.*?napisal:|.*?@\S+\s*wrote:|" +
-        r"Gönderildi:\s.*?$|Kime:\s.*?$)",
-        re.MULTILINE | re.DOTALL
-    )
-
-    # Split the email body at the reply point (keep only the first part before the reply starts)
-    match = reply_pattern.search(body)
+# Reply separators, anchored at the start of a line (optionally quoted). Attribution lines 
+# may be wrapped by the mail client, so they can span two lines but never more: every 
+# alternative only scans a bounded window, keeping the search linear in the body length
+# even on long single-line bodies.
+_ATTRIBUTION = r"[^\n]{0,300}(?:\n[^\n]{0,300})?"
+_HEADER_NAME = r"(?:Sent|Date|To|Cc|Subject|Envoyé|À|Objet|Gesendet|An|Betreff|Inviato|A|Oggetto|Enviado|Para|Asunto|Fecha)"
+REPLY_SEPARATORS = [
+    rf"On\s{_ATTRIBUTION}wrote:",
+    rf"Le\s{_ATTRIBUTION}écrit\s?:",
+    rf"Am\s{_ATTRIBUTION}schrieb[^\n]{{0,100}}:",
+    rf"El\s{_ATTRIBUTION}escribió:",
+    rf"Il\s{_ATTRIBUTION}ha scritto:",
+    rf"在\s{_ATTRIBUTION}写道[:：]",
+    rf"Em\s{_ATTRIBUTION}escreveu:",
+    rf"Op\s{_ATTRIBUTION}schreef:",
+    rf"日時：{_ATTRIBUTION}差出人：",
+    rf"Pada\s{_ATTRIBUTION}menulis:",
+    rf"Dne\s{_ATTRIBUTION}napsal(?:\(a\))?:",
+    rf"W dniu\s{_ATTRIBUTION}napisał(?:\(a\))?:",
+    r"Написано\s[^\n]{0,300}:",
+    rf"Na\s{_ATTRIBUTION}napisal:",
+    rf"[^\n]{{0,200}}[Tt]arihinde\s{_ATTRIBUTION}yazdı:",
+    r"Enviado\s[^\n]{0,300}:",
+    rf"(?:Op|På|Den)\s{_ATTRIBUTION}skrev:",
+    rf"(?:على|من)\s{_ATTRIBUTION}كتب:",
+    rf"Pošiljatelj\s{_ATTRIBUTION}napisal:",
+    r"[^\n]{0,300}@[^\s@]{1,300}\s*wrote:",
+    # Outlook-style headers, the short names that also start sentences ("De: my side, ...") 
+    # only when followed by another header line
+    r"(?:From|Sent|Envoyé|Gesendet|Inviato|Gönderildi|Kime|差出人)\s?[:：][^\n]*$",
+    rf"(?:De|Von|Da)\s?[:：][^\n]*\n[> \t]*{_HEADER_NAME}\s?[:：]",
+    r"-{5,}\s?(?:Original|Forwarded) [Mm]essage\s?-{5,}",
+    r"[_-]{32,}[ \t]*$",
+]
+REPLY_SEPARATOR_PATTERN = re.compile(
+    r"^[> \t]*(?:" + "|".join(REPLY_SEPARATORS) + ")", re.MULTILINE
+)
+
+# Signature delimiter & mobile client footers, the rest of the reply is a signature
+SIGNATURE_PATTERN = re.compile(
+    r"^[ \t]*(?:-- ?|Sent from my [^\n]*|Get Outlook for [^\n]*|Gesendet von [^\n]*|"
+    r"Envoyé de mon [^\n]*|Inviato da [^\n]*)[ \t]*$",
+    re.MULTILINE
+)
+QUOTED_LINE_PATTERN = re.compile(r"^[ \t]*>[^\n]*\n*", re.MULTILINE)
 
-    if match:
-        # Keep everything before the reply pattern starts
-        cleaned_body = body[:match.start()]
+def strip_old_replies(body):
+    """
+    Keep only the latest reply of an email body: cut at the first reply separator,
+    signature delimiter or mobile footer, and drop the remaining quoted lines.
+    """
+    body = body.replace("\r\n", "\n")
+    
+    # A body starting with a separator (e.g. a forward) keeps the text of the first reply
+    start = 0
+    for match in REPLY_SEPARATOR_PATTERN.finditer(body):
+        if body[start:match.start()].strip():
+            body = body[start:match.start()]
+            break
+        start = match.end()
     else:
-        cleaned_body = body  # No old replies found, return the body as is
-
-    # Remove lines starting with ">" and any following empty lines
-    cleaned_body = re.sub(r'^>.*?$\n*', '', cleaned_body, flags=re.MULTILINE)
-
-    return cleaned_body.strip()
+        body = body[start:]
+    
+    match = SIGNATURE_PATTERN.search(body)
+    if match and body[:match.start()].strip():
+        body = body[:match.start()]
+    
+    return QUOTED_LINE_PATTERN.sub("", body).strip()
 
 # def extract_response(s: str) -> str: 
 #     return next(re.finditer(r'Response:(.*?)(?=Reply:|$)', s, re.DOTALL), re.match('$', '')).group(1).strip()
@@ -93,19 +154,44 @@ def calculate_deadline():
     return deadline.strftime("%d %B %Y")
 
 def get_journal_price(journal_prices, email_subject):
+    """
+    Returns the price of the journal named at the end of the subject, None when unknown.
+    """
     subject_match = re.search(r"- (.+)$", email_subject)
-    journal_name = subject_match.group(1) if subject_match else None
-
-    return journal_prices[journal_name.strip()]
+    if not subject_match:
+        return None
+    return journal_prices.get(subject_match.group(1).strip())
+
+def fill_update_slots(email, state, journal_prices):
+    """
+    Fill the cost & deadline slots written by the RAG email writer with the latest values.
+    Returns the filled email and whether slots expected for the email inquiries are missing.
+    """
+    expected_slots = [slot for inquiry, slot in UPDATE_SLOTS.items() if inquiry in state['email_inquiries']]
+    slots_missing = any(slot not in email for slot in expected_slots)
+    if JOURNAL_PRICE_SLOT in email:
+        journal_price = get_journal_price(journal_prices, state['current_email'].subject)
+        if journal_price is None:
+            # Left in the email for update_email_info_chain
+            slots_missing = True
+        else:
+            email = email.replace(JOURNAL_PRICE_SLOT, f"{journal_price}$")
+    if SUBMISSION_DEADLINE_SLOT in email:
+        email = email.replace(SUBMISSION_DEADLINE_SLOT, calculate_deadline())
+    # Remove unnecessary empty lines
+    return re.sub(r"\n{3,}", "\n\n", email).strip(), slots_missing
 
-def compose_update_information(state, journal_prices):
+def compose_update_information(state, journal_prices, email=""):
     update_info = ""
-    if "Fees or Charges" in state['email_inquiries']:
+    if "Fees or Charges" in state['email_inquiries'] or JOURNAL_PRICE_SLOT in email:
         journal_price = get_journal_price(
             journal_prices,
             state['current_email'].subject
         )
-        update_info += f"Latest Annual Journal Cost: {journal_price}$\n"
+        if journal_price is None:
+            update_info += f"Latest Annual Journal Cost: unknown, remove any mention of the cost (including {JOURNAL_PRICE_SLOT})\n"
+        else:
+            update_info += f"Latest Annual Journal Cost: {journal_price}$\n"
     if "Submission Deadlines" in state['email_inquiries']:
         deadline = calculate_deadline()
         update_info += f"Latest Submission deadline: {deadline}\n"
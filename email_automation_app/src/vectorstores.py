@@ -0,0 +1,204 @@
+import os, json, uuid, threading
+import numpy as np
+from langchain_core.documents import Document
+from langchain_core.vectorstores import VectorStore
+from langchain_chroma import Chroma
+from .utils import RAG_DATABASE_DIR
+
+NUMPY_INDEX_FILE = "numpy_index.json"
+
+def load_vectorstore(embeddings, persist_directory=RAG_DATABASE_DIR, backend=None, create=False):
+    """
+    Open the vector database with the backend selected by VECTOR_STORE_BACKEND (chroma or numpy).
+    A missing NumPy index is an error unless `create` is set, the RAG would silently get no context.
+    """
+    backend = backend or os.getenv("VECTOR_STORE_BACKEND", "chroma")
+    if backend == "numpy":
+        if not create and not os.path.exists(os.path.join(persist_directory, NUMPY_INDEX_FILE)):
+            raise FileNotFoundError(
+                f"No NumPy vector index in {persist_directory}, build it with "
+                "scripts/build_index.py --backend numpy (add --from-chroma to copy the Chroma database)"
+            )
+        return NumpyVectorStore(persist_directory, embeddings)
+    if backend == "chroma":
+        return Chroma(persist_directory=persist_directory, embedding_function=embeddings)
+    raise ValueError(f"Unknown vector store backend: {backend}")
+
+class NumpyVectorStore(VectorStore):
+    def __init__(self, persist_directory, embedding):
+        """
+        Vector store keeping the embeddings in a memory-mapped NumPy matrix with a JSON
+        sidecar for ids, texts and metadata, searched with an exact cosine top-k.
+        The sidecar names the matrix file, so it is swapped atomically on every write.
+        """
+        self.persist_directory = persist_directory
+        self.embedding = embedding
+        self.index_path = os.path.join(persist_directory, NUMPY_INDEX_FILE)
+        self.lock = threading.Lock()
+        self.loaded_mtime = None
+        self._load()
+
+    @property
+    def embeddings(self):
+        return self.embedding
+
+    def _load(self):
+        self.ids, self.documents, self.metadatas = [], [], []
+        self.vectors = np.zeros((0, 0), dtype=np.float32)
+        self.norms = np.zeros(0, dtype=np.float32)
+        if not os.path.exists(self.index_path):
+            return
+
+        self.loaded_mtime = os.path.getmtime(self.index_path)
+        with open(self.index_path) as f:
+            index = json.load(f)
+        self.ids, self.documents, self.metadatas = index["ids"], index["documents"], index["metadatas"]
+        if self.ids:
+            self.vectors = np.load(os.path.join(self.persist_directory, index["vectors_file"]), mmap_mode="r")
+            self.norms = np.linalg.norm(self.vectors, axis=1)
+            self.norms[self.norms == 0] = 1.0
+
+    def _reload_if_changed(self):
+        # The index can be rebuilt by another process while the app is running
+        mtime = os.path.getmtime(self.index_path) if os.path.exists(self.index_path) else None
+        if mtime != self.loaded_mtime:
+            self._load()
+
+    def _save(self, ids, vectors, documents, metadatas):
+        os.makedirs(self.persist_directory, exist_ok=True)
+        previous = None
+        if os.path.exists(self.index_path):
+            with open(self.index_path) as f:
+                previous = json.load(f)["vectors_file"]
+
+        vectors_file = f"numpy_vectors.{uuid.uuid4().hex[:12]}.npy"
+        np.save(os.path.join(self.persist_directory, vectors_file), np.asarray(vectors, dtype=np.float32))
+        tmp_path = self.index_path + ".tmp"
+        with open(tmp_path, "w") as f:
+            json.dump({"vectors_file": vectors_file, "ids": ids, "documents": documents, "metadatas": metadatas}, f)
+        os.replace(tmp_path, self.index_path)
+
+        # The previous matrix is kept until the next save, readers that loaded its sidecar 
+        # can still open it, older ones are removed
+        for name in os.listdir(self.persist_directory):
+            if name.startswith("numpy_vectors.") and name.endswith(".npy") and name not in (vectors_file, previous):
+                os.remove(os.path.join(self.persist_directory, name))
+        self._load()
+
+    def get_ids(self):
+        with self.lock:
+            self._reload_if_changed()
+            return list(self.ids)
+
+    def get_by_ids(self, ids, /):
+        with self.lock:
+            self._reload_if_changed()
+            positions = {id: i for i, id in enumerate(self.ids)}
+            return [
+                Document(id=id, page_content=self.documents[positions[id]], metadata=self.metadatas[positions[id]])
+                for id in ids if id in positions
+            ]
+
+    def upsert_vectors(self, ids, vectors, documents, metadatas, delete_ids=()):
+        """
+        Add or replace rows with precomputed embeddings, and delete the rows of
+        `delete_ids` in the same write.
+        """
+        with self.lock:
+            self._reload_if_changed()
+            removed = set(delete_ids)
+            keep = [i for i, id in enumerate(self.ids) if id not in removed]
+            all_ids = [self.ids[i] for i in keep]
+            all_documents = [self.documents[i] for i in keep]
+            all_metadatas = [self.metadatas[i] for i in keep]
+            all_vectors = [row for row in np.asarray(self.vectors)[keep]] if keep else []
+            rows = {id: i for i, id in enumerate(all_ids)}
+            for id, vector, document, metadata in zip(ids, vectors, documents, metadatas):
+                if id in rows:
+                    i = rows[id]
+                    all_vectors[i], all_documents[i], all_metadatas[i] = vector, document, metadata or {}
+                else:
+                    rows[id] = len(all_ids)
+                    all_ids.append(id)
+                    all_vectors.append(vector)
+                    all_documents.append(document)
+                    all_metadatas.append(metadata or {})
+            self._save(all_ids, all_vectors, all_documents, all_metadatas)
+        return list(ids)
+
+    def add_texts(self, texts, metadatas=None, *, ids=None, **kwargs):
+        texts = list(texts)
+        ids = ids or [str(uuid.uuid4()) for _ in texts]
+        metadatas = metadatas or [{} for _ in texts]
+        return self.upsert_vectors(ids, self.embedding.embed_documents(texts), texts, metadatas)
+
+    def delete(self, ids=None, **kwargs):
+        if not ids:
+            return False
+        with self.lock:
+            self._reload_if_changed()
+            removed = set(ids)
+            keep = [i for i, id in enumerate(self.ids) if id not in removed]
+            self._save(
+                [self.ids[i] for i in keep],
+                np.asarray(self.vectors)[keep] if keep else [],
+                [self.documents[i] for i in keep],
+                [self.metadatas[i] for i in keep]
+            )
+        return True
+
+    def search_by_vectors(self, query_vectors, k=4):
+        """
+        Exact top-k of several query vectors with a single matrix product.
+        Returns a list of (Document, cosine similarity) lists.
+        """
+        with self.lock:
+            self._reload_if_changed()
+            if not self.ids:
+                return [[] for _ in query_vectors]
+            queries = np.asarray(query_vectors, dtype=np.float32)
+            queries = queries / np.maximum(np.linalg.norm(queries, axis=1, keepdims=True), 1e-12)
+            scores = (queries @ self.vectors.T) / self.norms
+
+            k = min(k, len(self.ids))
+            top = np.argpartition(-scores, k - 1, axis=1)[:, :k]
+            results = []
+            for row, candidates in zip(scores, top):
+                ranked = candidates[np.argsort(-row[candidates])]
+                results.append([
+                    (Document(id=self.ids[i], page_content=self.documents[i], metadata=self.metadatas[i]), float(row[i]))
+                    for i in ranked
+                ])
+            return results
+
+    def similarity_search_with_score_by_vector(self, embedding, k=4):
+        return self.search_by_vectors([embedding], k)[0]
+
+    def similarity_search_by_vector(self, embedding, k=4, **kwargs):
+        return [doc for doc, _ in self.similarity_search_with_score_by_vector(embedding, k)]
+
+    def similarity_search_with_score(self, query, k=4, **kwargs):
+        return self.similarity_search_with_score_by_vector(self.embedding.embed_query(query), k)
+
+    def similarity_search(self, query, k=4, **kwargs):
+        return [doc for doc, _ in self.similarity_search_with_score(query, k)]
+
+    def _select_relevance_score_fn(self):
+        # Scores are cosine similarities, rescaled from [-1, 1] to [0, 1]
+        return lambda similarity: (similarity + 1) / 2
+
+    @classmethod
+    def from_texts(cls, texts, embedding, metadatas=None, *, ids=None, persist_directory=RAG_DATABASE_DIR, **kwargs):
+        store = cls(persist_directory, embedding)
+        store.add_texts(texts, metadatas, ids=ids)
+        return store
+
+    @classmethod
+    def from_chroma(cls, chroma, persist_directory):
+        """
+        Copy the chunks and embeddings of a Chroma store without embedding them again.
+        """
+        data = chroma.get(include=["embeddings", "documents", "metadatas"])
+        store = cls(persist_directory, chroma.embeddings)
+        store.upsert_vectors(data["ids"], data["embeddings"], data["documents"], data["metadatas"])
+        return store
@@ -0,0 +1,30 @@
+from src.budget import BudgetedChain, TokenUsageLog, drop_signature
+
+SIGNATURE = "\n\nBest regards,\nJohn\nProfessor of Economics\nUniversity of Science\n+1 555 0100"
+
+def test_signature_block_is_dropped():
+    body = "Dear Elena,\n\nWhat are the fees?" + SIGNATURE
+    assert drop_signature(body) == "Dear Elena,\n\nWhat are the fees?\n\nBest regards,\nJohn"
+
+def test_opening_thanks_keeps_the_reply():
+    body = "Thanks for your reply.\nAlso, is the journal indexed in Scopus?\nWhat is the deadline?\nAnd the word count?\nI also have a coauthor.\nShe is in Berlin.\nWe can submit in May."
+    assert drop_signature(body) == body
+
+class EchoChain:
+    def invoke(self, input, config=None, **kwargs):
+        return "draft"
+
+def test_context_fields_are_not_trimmed():
+    context = "Fees: 500 USD.\nThank you for your interest.\nDeadline: 15th.\nIndexed in Scopus.\n" * 40
+    chain = BudgetedChain(
+        EchoChain(), "write_email", "", TokenUsageLog(), 
+        text_fields=["email_content"], context_fields=["context"]
+    )
+    email = "Dear Elena,\n\n" + "I would like to publish my paper on energy markets.\n" * 120 + "What are the fees?" + SIGNATURE
+    input = {"email_content": email, "context": context}
+    # Just over budget, dropping the signature is enough
+    chain.budget = chain.count_tokens(input) - 5
+    input, tokens, _ = chain.fit(input)
+    assert input["context"] == context
+    assert input["email_content"].endswith("What are the fees?\n\nBest regards,\nJohn")
+    assert tokens <= chain.budget
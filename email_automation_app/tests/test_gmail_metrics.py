@@ -0,0 +1,34 @@
+from prometheus_client import REGISTRY
+from benchmarks.fake_gmail import FakeGmailServer, make_message
+from src.tools.GoogleAPITools import GmailToolsClass
+from src.store import SyncCheckpointStore, DraftIndexStore, MessageLedgerStore
+
+INBOX = "metrics@nabpress.com"
+
+def sample(name, method):
+    return REGISTRY.get_sample_value(name, {"api": "gmail", "inbox": INBOX, "method": method}) or 0.0
+
+def test_batched_gets_are_counted_with_their_errors(tmp_path):
+    server = FakeGmailServer([make_message("msg0", "thread0", "Researcher <researcher@uni.edu>", "Invitation", "Hello")]).start()
+    try:
+        db_path = str(tmp_path / "state.sqlite3")
+        gmail_tools = GmailToolsClass(
+            INBOX, service=server.build_service(), batch_uri=server.batch_uri,
+            checkpoints=SyncCheckpointStore(db_path), draft_index=DraftIndexStore(db_path), ledger=MessageLedgerStore(db_path)
+        )
+        before = {
+            name: {method: sample(name, method) for method in ["gmail.users.messages.get", "gmail.batch"]}
+            for name in ["email_automation_google_api_calls_total", "email_automation_google_api_errors_total"]
+        }
+        messages, failed_ids = gmail_tools._batch_get_messages(["msg0", "missing"], format="full")
+    finally:
+        server.stop()
+
+    assert list(messages) == ["msg0"]
+    # Deleted messages are not fetch failures
+    assert failed_ids == []
+    calls, errors = "email_automation_google_api_calls_total", "email_automation_google_api_errors_total"
+    assert sample(calls, "gmail.users.messages.get") - before[calls]["gmail.users.messages.get"] == 2
+    assert sample(errors, "gmail.users.messages.get") - before[errors]["gmail.users.messages.get"] == 1
+    assert sample(calls, "gmail.batch") - before[calls]["gmail.batch"] == 1
+    assert sample(errors, "gmail.batch") - before[errors]["gmail.batch"] == 0
@@ -0,0 +1,14 @@
+import os
+from src.indexing import split_source, SOURCE_ROOT
+
+def test_chunk_ids_do_not_depend_on_the_working_directory(tmp_path, monkeypatch):
+    source = tmp_path / "faq.txt"
+    source.write_text("What are the fees?\n\n###\n\nWhat is the deadline?", encoding="utf-8")
+
+    monkeypatch.chdir(tmp_path)
+    from_source_dir = split_source("faq.txt", separator="\n\n###\n\n")
+    monkeypatch.chdir(SOURCE_ROOT)
+    from_root = split_source(str(source), separator="\n\n###\n\n")
+
+    assert from_source_dir == from_root
+    assert {metadata["source"] for _, metadata in from_root.values()} == {os.path.relpath(source, SOURCE_ROOT)}
@@ -0,0 +1,54 @@
+import time
+from src.jobs import JobManager
+from src.scheduler import InboxScheduler
+
+def wait_for(jobs, job_id, status, timeout=2.0):
+    deadline = time.time() + timeout
+    while jobs.get_status(job_id)["status"] != status and time.time() < deadline:
+        time.sleep(0.01)
+    return jobs.get_status(job_id)["status"]
+
+def test_streamed_runs_take_a_job_slot():
+    jobs = JobManager(max_concurrent_jobs=1)
+    events = jobs.stream(iter([{"event": "node"}, {"event": "done"}]))
+    assert next(events) == {"event": "node"}
+
+    # The slot is taken until the stream ends
+    assert not jobs.has_free_slot()
+    assert list(jobs.stream(iter([{"event": "node"}]), busy_event={"event": "error"})) == [{"event": "error"}]
+    job_id = jobs.submit(lambda: "report")["job_id"]
+    time.sleep(0.05)
+    assert jobs.get_status(job_id)["status"] == "queued"
+
+    assert list(events) == [{"event": "done"}]
+    assert wait_for(jobs, job_id, "completed") == "completed"
+    jobs.shutdown()
+
+def test_closed_streams_release_their_slot():
+    jobs = JobManager(max_concurrent_jobs=1)
+    events = jobs.stream(iter([{"event": "node"}, {"event": "done"}]))
+    next(events)
+    events.close()
+    assert jobs.has_free_slot()
+    jobs.shutdown()
+
+def test_streams_dropped_before_starting_hold_no_slot():
+    jobs = JobManager(max_concurrent_jobs=1)
+    events = jobs.stream(iter([{"event": "node"}]))
+    assert jobs.has_free_slot()
+    events.close()
+    assert jobs.has_free_slot()
+    jobs.shutdown()
+
+class SlowScheduler(InboxScheduler):
+    def process_inbox(self, inbox, emit=None, stop=None):
+        emit({"event": "node", "inbox": inbox})
+        time.sleep(1.0)
+        return {"inbox": inbox, "emails_processed": 0}
+
+def test_closing_a_stream_does_not_wait_for_running_inboxes():
+    events = SlowScheduler(workflow=None, inboxes=["a@nabpress.com", "b@nabpress.com"], max_concurrency=1).stream()
+    assert next(events)["event"] == "node"
+    start = time.perf_counter()
+    events.close()
+    assert time.perf_counter() - start < 0.5
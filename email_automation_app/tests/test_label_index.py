@@ -0,0 +1,17 @@
+from benchmarks.fake_models import FakeEmbeddings
+from src.vectorstores import NumpyVectorStore
+from src.retrieval import LabelIndex, MultiQueryRetriever, vectorstore_fingerprint
+
+def test_label_index_is_rebuilt_for_another_k(tmp_path):
+    embeddings = FakeEmbeddings(dimension=8)
+    store = NumpyVectorStore(str(tmp_path), embeddings)
+    store.add_texts(["fees", "deadline", "indexing"], ids=["a", "b", "c"])
+    fingerprint = vectorstore_fingerprint(store)
+    label_index = LabelIndex(str(tmp_path / "label_index.json"), labels=["Fees"])
+    label_index.build(MultiQueryRetriever(store, embeddings, k=1), fingerprint)
+
+    assert LabelIndex(label_index.path, labels=["Fees"]).load(fingerprint, 1)
+    assert not LabelIndex(label_index.path, labels=["Fees"]).load(fingerprint, 2)
+
+    retriever = MultiQueryRetriever(store, embeddings, k=2, label_index=LabelIndex(label_index.path, labels=["Fees"]))
+    assert len(retriever.get_label_documents("Fees")) == 2
@@ -0,0 +1,44 @@
+import os
+import pytest
+from benchmarks.fake_models import FakeEmbeddings
+from src.vectorstores import NumpyVectorStore, load_vectorstore
+from src.indexing import IndexBuilder
+
+def matrix_files(directory):
+    return sorted(name for name in os.listdir(directory) if name.endswith(".npy"))
+
+def test_previous_matrix_is_kept_until_the_next_save(tmp_path):
+    store = NumpyVectorStore(str(tmp_path), FakeEmbeddings(dimension=8))
+    store.add_texts(["fees"], ids=["a"])
+    first = matrix_files(tmp_path)
+    store.add_texts(["deadline"], ids=["b"])
+    assert set(first) < set(matrix_files(tmp_path))
+    assert len(matrix_files(tmp_path)) == 2
+
+    store.add_texts(["indexing"], ids=["c"])
+    assert len(matrix_files(tmp_path)) == 2
+    assert not set(first) & set(matrix_files(tmp_path))
+
+def test_sync_is_a_single_write(tmp_path):
+    embeddings = FakeEmbeddings(dimension=8)
+    store = NumpyVectorStore(str(tmp_path), embeddings)
+    store.add_texts(["fees", "deadline"], metadatas=[{"source": "faq.md"}] * 2, ids=["a", "b"])
+    before = matrix_files(tmp_path)
+
+    chunks = {"b": ("deadline", {"source": "faq.md"}), "c": ("indexing", {"source": "faq.md"})}
+    report = IndexBuilder(store, embeddings).sync(chunks)
+
+    assert report == {"added": 1, "deleted": 1, "unchanged": 1}
+    assert sorted(store.get_ids()) == ["b", "c"]
+    # The matrix of the previous write is still there, so this sync wrote once
+    assert set(before) & set(matrix_files(tmp_path))
+    assert [doc.page_content for doc in store.get_by_ids(["b", "c"])] == ["deadline", "indexing"]
+
+def test_missing_index_is_an_error(tmp_path):
+    with pytest.raises(FileNotFoundError, match="build_index.py --backend numpy"):
+        load_vectorstore(FakeEmbeddings(dimension=8), str(tmp_path), "numpy")
+
+    # The index builder creates it
+    store = load_vectorstore(FakeEmbeddings(dimension=8), str(tmp_path), "numpy", create=True)
+    store.add_texts(["fees"], ids=["a"])
+    assert load_vectorstore(FakeEmbeddings(dimension=8), str(tmp_path), "numpy").get_ids() == ["a"]
@@ -0,0 +1,34 @@
+import time
+from src.utils import strip_old_replies
+
+def test_line_content_is_kept():
+    body = "Hello Elena,\n\n    def fees():\n        return 500\n\nBest,\nJohn"
+    assert strip_old_replies(body) == body
+
+def test_short_header_names_in_sentences_are_kept():
+    body = "Hello Elena,\n\nDe: my side, I am ready to submit.\n\nJohn"
+    assert strip_old_replies(body) == body
+
+def test_outlook_header_blocks_are_cut():
+    for header in [
+        "De: Elena <editorials@nabpress.com>\nEnvoyé: mardi 4 juin 2024 09:02\nÀ: John",
+        "Von: Elena <editorials@nabpress.com>\nGesendet: Dienstag, 4. Juni 2024 09:02\nAn: John",
+        "Da: Elena <editorials@nabpress.com>\nInviato: martedì 4 giugno 2024 09:02\nA: John",
+        "From: Elena <editorials@nabpress.com>\nSent: Tuesday, June 4, 2024 9:02 AM\nTo: John",
+    ]:
+        body = f"Hello Elena,\n\nI am ready to submit.\n\n{header}\nSubject: Invitation\n\nDear John, ..."
+        assert strip_old_replies(body) == "Hello Elena,\n\nI am ready to submit."
+
+def test_indented_quotes_and_signatures_are_cut():
+    body = "I am ready to submit.\n  -- \nJohn Doe\n  > Dear John,"
+    assert strip_old_replies(body) == "I am ready to submit."
+
+def test_turkish_attribution_is_cut():
+    body = "I am ready to submit.\n\n12 Mar 2024 Sal, 10:15 tarihinde Elena <editorials@nabpress.com> şunu yazdı:\n> Dear John,"
+    assert strip_old_replies(body) == "I am ready to submit."
+
+def test_long_single_line_bodies_are_linear():
+    body = "Hello Elena, tarihinde we wrote to a@b.c about it " * 6000
+    start = time.perf_counter()
+    assert strip_old_replies(body) == body.strip()
+    assert time.perf_counter() - start < 0.5
@@ -0,0 +1,116 @@
+import threading
+import pytest
+from benchmarks.fake_gmail import FakeGmailServer, make_message
+from src.tools import GoogleAPITools
+from src.tools.GoogleAPITools import GmailToolsClass
+from src.scheduler import InboxScheduler
+from src.store import SyncCheckpointStore, DraftIndexStore, MessageLedgerStore, OUTCOME_DRAFTED, OUTCOME_FAILED
+
+INBOX = "editorials@nabpress.com"
+
+class FakeApp:
+    def __init__(self, outcome=OUTCOME_DRAFTED, error=None):
+        self.outcome = outcome
+        self.error = error
+
+    def invoke(self, state, config):
+        if self.error:
+            raise self.error
+        return {"results": [{"id": email.id, "outcome": self.outcome} for email in state["emails"]]}
+
+class FakeNodes:
+    def __init__(self, gmail_tools):
+        self.gmail_tools = gmail_tools
+        self.lock = threading.Lock()
+
+    def get_inbox_lock(self, inbox):
+        return self.lock
+
+    def get_gmail_tools(self, inbox):
+        return self.gmail_tools
+
+class FakeWorkflow:
+    def __init__(self, gmail_tools, app):
+        self.nodes = FakeNodes(gmail_tools)
+        self.app = app
+
+@pytest.fixture
+def server():
+    messages = [
+        make_message(f"msg{i}", f"thread{i}", f"Researcher <researcher{i}@uni.edu>", "Invitation - Journal of Science", "I want to publish")
+        for i in range(3)
+    ]
+    server = FakeGmailServer(messages).start()
+    yield server
+    server.stop()
+
+@pytest.fixture
+def gmail_tools(server, tmp_path):
+    db_path = str(tmp_path / "state.sqlite3")
+    gmail_tools = GmailToolsClass(
+        INBOX, service=server.build_service(), batch_uri=server.batch_uri, sync_mode="incremental",
+        checkpoints=SyncCheckpointStore(db_path), draft_index=DraftIndexStore(db_path), ledger=MessageLedgerStore(db_path)
+    )
+    gmail_tools.checkpoints.set_history_id(INBOX, 100)
+    return gmail_tools
+
+def run_inbox(gmail_tools, app):
+    return InboxScheduler(FakeWorkflow(gmail_tools, app), inboxes=[INBOX]).process_inbox(INBOX)
+
+def test_checkpoint_not_moved_while_batches_are_consumed(gmail_tools):
+    batches = gmail_tools.iter_unreplied_threads()
+    assert len(next(batches)) == 3
+    assert gmail_tools.checkpoints.get_history_id(INBOX) == "100"
+    with pytest.raises(StopIteration) as done:
+        next(batches)
+    assert done.value.value == ("103", 0)
+    assert gmail_tools.checkpoints.get_history_id(INBOX) == "100"
+
+def test_checkpoint_committed_after_all_batches(gmail_tools):
+    report = run_inbox(gmail_tools, FakeApp())
+    assert report["emails_processed"] == 3
+    assert gmail_tools.checkpoints.get_history_id(INBOX) == "103"
+
+def test_checkpoint_kept_when_run_raises(gmail_tools):
+    report = run_inbox(gmail_tools, FakeApp(error=RuntimeError("LLM unavailable")))
+    assert report["error"] == "LLM unavailable"
+    assert gmail_tools.checkpoints.get_history_id(INBOX) == "100"
+    # Emails are listed again on the next run
+    assert len(next(gmail_tools.iter_unreplied_threads())) == 3
+
+def test_checkpoint_kept_when_emails_failed(gmail_tools):
+    run_inbox(gmail_tools, FakeApp(outcome=OUTCOME_FAILED))
+    assert gmail_tools.checkpoints.get_history_id(INBOX) == "100"
+
+def test_resync_checkpoint_committed_after_all_batches(server, gmail_tools):
+    gmail_tools.checkpoints.execute("DELETE FROM sync_checkpoints")
+    batches = gmail_tools.iter_unreplied_threads()
+    next(batches)
+    assert gmail_tools.checkpoints.get_history_id(INBOX) is None
+    run_inbox(gmail_tools, FakeApp())
+    assert gmail_tools.checkpoints.get_history_id(INBOX) == str(server.history_id)
+
+@pytest.fixture
+def no_retry_delay(monkeypatch):
+    monkeypatch.setattr(GoogleAPITools, "GMAIL_BATCH_RETRY_DELAY", 0)
+
+def test_rate_limited_fetches_are_retried(server, gmail_tools, no_retry_delay):
+    server.fail_gets("msg1", times=2)
+    report = run_inbox(gmail_tools, FakeApp())
+    assert report["emails_processed"] == 3
+    assert report["emails_failed"] == 0
+    assert gmail_tools.checkpoints.get_history_id(INBOX) == "103"
+
+def test_checkpoint_kept_when_a_fetch_keeps_failing(server, gmail_tools, no_retry_delay, monkeypatch):
+    monkeypatch.setattr(GoogleAPITools, "GMAIL_BATCH_RETRIES", 0)
+    server.fail_gets("msg1")
+    report = run_inbox(gmail_tools, FakeApp())
+    assert report["emails_processed"] == 2
+    assert report["emails_failed"] == 1
+    assert gmail_tools.checkpoints.get_history_id(INBOX) == "100"
+
+    # The next run lists the email again
+    batches = gmail_tools.iter_unreplied_threads()
+    assert "msg1" in [email["id"] for email in next(batches)]
+    run_inbox(gmail_tools, FakeApp())
+    assert gmail_tools.checkpoints.get_history_id(INBOX) == "103"
@@ -0,0 +1,17 @@
+from src.tiering import ModelRouter, TIER_FLASH, TIER_PRO
+
+def test_default_routing(monkeypatch):
+    for name in ["MODEL_TIERING_ENABLED", "TIER_FLASH_MAX_EMAIL_CHARS", "TIER_FLASH_MAX_INQUIRIES", "TIER_FLASH_MIN_CONFIDENCE"]:
+        monkeypatch.delenv(name, raising=False)
+    router = ModelRouter()
+    # Emails classified by the LLM, no local classifier model needed
+    assert router.select(200, inquiries=1, confidence=None) == (TIER_FLASH, "simple_email")
+    assert router.select(5000, inquiries=1, confidence=None) == (TIER_PRO, "long_email")
+    assert router.select(200, inquiries=5, confidence=None) == (TIER_PRO, "many_inquiries")
+    # Local predictions
+    assert router.select(200, inquiries=1, confidence=0.9) == (TIER_PRO, "low_confidence")
+    assert router.select(200, inquiries=1, confidence=0.99) == (TIER_FLASH, "simple_email")
+
+def test_tiering_can_be_disabled(monkeypatch):
+    monkeypatch.setenv("MODEL_TIERING_ENABLED", "false")
+    assert ModelRouter().select(200, inquiries=1, confidence=0.99) == (TIER_PRO, "disabled")
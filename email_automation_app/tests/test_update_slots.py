@@ -0,0 +1,35 @@
+from src.state import Email
+from src.utils import fill_update_slots, compose_update_information, calculate_deadline
+
+JOURNAL_PRICES = {"Journal of Science": 500}
+
+def make_state(subject, inquiries):
+    email = Email(id="1", threadId="t1", sender="John <john@uni.edu>", sender_email="john@uni.edu", subject=subject, body="")
+    return {"current_email": email, "email_inquiries": inquiries}
+
+def test_slots_are_filled_locally():
+    state = make_state("Invitation - Journal of Science", ["Fees or Charges", "Submission Deadlines"])
+    draft = "Dear John,\n\n\n\nThe cost is [JOURNAL_PRICE] and the deadline is [SUBMISSION_DEADLINE].\n\nRegards,\nElena"
+    email, slots_missing = fill_update_slots(draft, state, JOURNAL_PRICES)
+    assert not slots_missing
+    assert email == f"Dear John,\n\nThe cost is 500$ and the deadline is {calculate_deadline()}.\n\nRegards,\nElena"
+
+def test_missing_expected_slot():
+    state = make_state("Invitation - Journal of Science", ["Fees or Charges"])
+    email, slots_missing = fill_update_slots("Dear John,\nThe cost is 300$.\nRegards,\nElena", state, JOURNAL_PRICES)
+    assert slots_missing
+    assert email == "Dear John,\nThe cost is 300$.\nRegards,\nElena"
+
+def test_unknown_journal_price_is_a_missing_slot():
+    # The slot can come from the past replies context without any fees inquiry
+    state = make_state("Invitation to publish your paper", ["Submission Process and Procedure"])
+    draft = "Dear John,\nThe cost is [JOURNAL_PRICE].\nRegards,\nElena"
+    email, slots_missing = fill_update_slots(draft, state, JOURNAL_PRICES)
+    assert slots_missing
+    assert "[JOURNAL_PRICE]" in email
+    assert "unknown" in compose_update_information(state, JOURNAL_PRICES, email)
+
+def test_unlisted_journal_price_is_a_missing_slot():
+    state = make_state("Invitation - Unknown Journal", ["Fees or Charges"])
+    _, slots_missing = fill_update_slots("Dear John,\nThe cost is [JOURNAL_PRICE].\nRegards,\nElena", state, JOURNAL_PRICES)
+    assert slots_missing